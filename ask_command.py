@@ -1,9 +1,14 @@
 import asyncio
+import hashlib
+import json
+import re
+import threading
 import traceback
-import google.generativeai as genai
+import unicodedata
+from typing import Optional
 from pyrogram import Client, filters
 from pyrogram.types import Message
-from wordle_solver import WordleSolver # NEW: Import the solver
+from ttl_cache import TTLCache
 
 # Define the persona prompt here, so it can be reused across functions
 PERSONA_PROMPT = """You are responding as if you are the actual user whose account this is. You should:
@@ -19,8 +24,305 @@ PERSONA_PROMPT = """You are responding as if you are the actual user whose accou
 
 Remember: You ARE this person, not an AI helping them. Respond accordingly."""
 
-# Initialize the Wordle Solver globally or within the function if preferred
-wordle_solver = WordleSolver()
+# Changes whenever the persona prompt does, so cached answers written for an older persona are never reused
+PERSONA_VERSION = hashlib.sha256(PERSONA_PROMPT.encode()).hexdigest()[:12]
+
+
+class ResponseCache(TTLCache):
+    """
+    Cache of Gemini answers for .ask, .ask g and .ask t, keyed by
+    (sub-command, normalized input, target language, model name, persona version),
+    with hit/miss counters per sub-command.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 24 * 3600, db_path: Optional[str] = None):
+        super().__init__(max_entries, ttl, db_path, table="ask_responses")
+        self.command_stats = {}  # sub-command -> {"hits", "misses"}
+
+    @staticmethod
+    def make_key(sub_cmd: str, text: str, target_lang: Optional[str], model_name: str) -> str:
+        normalized = re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+        raw = "\x00".join([sub_cmd, normalized, (target_lang or "").lower(), model_name, PERSONA_VERSION])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def lookup(self, sub_cmd: str, text: str, target_lang: Optional[str], model_name: str) -> Optional[str]:
+        answer = self.get(self.make_key(sub_cmd, text, target_lang, model_name))
+        counters = self.command_stats.setdefault(sub_cmd, {"hits": 0, "misses": 0})
+        counters["hits" if answer is not None else "misses"] += 1
+        return answer
+
+    def remember(self, sub_cmd: str, text: str, target_lang: Optional[str], model_name: str, answer: str):
+        self.set(self.make_key(sub_cmd, text, target_lang, model_name), answer)
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["by_command"] = {
+            sub_cmd: dict(counters, hit_rate=round(counters["hits"] / (counters["hits"] + counters["misses"]), 3))
+            for sub_cmd, counters in self.command_stats.items()
+        }
+        return stats
+
+
+response_cache = None  # Created on first use from the userbot's config
+
+
+def get_response_cache(userbot_instance) -> ResponseCache:
+    global response_cache
+    if response_cache is None:
+        config = userbot_instance.config
+        response_cache = ResponseCache(config.ASK_CACHE_SIZE, config.ASK_CACHE_TTL, config.ASK_CACHE_DB or None)
+    return response_cache
+
+
+class AskBatcher:
+    """
+    Opt-in micro-batching of .ask g / .ask t requests.
+    Requests of the same kind (grammar, or translation into the same language) that arrive
+    within `window` seconds are sent as one numbered prompt asking for a JSON object, and the
+    answer is split back out to each caller. If the reply can't be parsed, every request falls
+    back to its own model call.
+    """
+
+    def __init__(self, gateway, window: float = 0.03, max_batch: int = 8):
+        self.gateway = gateway
+        self.window = window
+        self.max_batch = max_batch
+        self.pending = {}  # (sub_cmd, target_lang) -> [(text, single_prompt, future)]
+        self.batches = 0
+        self.fallbacks = 0
+
+    async def submit(self, sub_cmd: str, text: str, target_lang: Optional[str], single_prompt: str) -> Optional[str]:
+        """Queue one request; returns its answer text, or None if the model produced none."""
+        kind = (sub_cmd, (target_lang or "").lower())
+        future = asyncio.get_running_loop().create_future()
+        batch = self.pending.setdefault(kind, [])
+        batch.append((text, single_prompt, future))
+        if len(batch) == 1:
+            asyncio.get_running_loop().call_later(self.window, self._flush_soon, kind, batch)
+        elif len(batch) >= self.max_batch:
+            self._flush_soon(kind, batch)
+        return await future
+
+    def _flush_soon(self, kind, batch):
+        if self.pending.get(kind) is batch:
+            del self.pending[kind]
+            asyncio.create_task(self._flush(kind, batch))
+
+    @staticmethod
+    def build_prompt(sub_cmd: str, target_lang: str, texts: list[str]) -> str:
+        if sub_cmd == "g":
+            task = "Correct the grammar and spelling of each numbered text below."
+        else:
+            task = f"Translate each numbered text below into {target_lang}."
+        numbered = json.dumps({str(i + 1): text for i, text in enumerate(texts)}, ensure_ascii=False, indent=1)
+        return (
+            f"{PERSONA_PROMPT}\n\n{task} "
+            "Reply with only a JSON object mapping each number to its result, e.g. {\"1\": \"...\", \"2\": \"...\"}, "
+            "without any introductory or concluding remarks.\n\n"
+            f"Texts:\n{numbered}"
+        )
+
+    @staticmethod
+    def parse_answer(text: str, count: int) -> Optional[list[str]]:
+        match = re.search(r"\{.*\}", text, re.DOTALL)  # Tolerate ```json fences and stray words
+        if not match:
+            return None
+        try:
+            results = json.loads(match.group(0))
+        except ValueError:
+            return None
+        if not isinstance(results, dict) or any(not isinstance(results.get(str(i + 1)), str) for i in range(count)):
+            return None
+        return [results[str(i + 1)] for i in range(count)]
+
+    async def _single(self, single_prompt: str) -> Optional[str]:
+        response = await self.gateway.generate(single_prompt)
+        return response.text if response.candidates else None
+
+    async def _flush(self, kind, batch):
+        sub_cmd, target_lang = kind
+        results = None
+        if len(batch) > 1:
+            try:
+                response = await self.gateway.generate(self.build_prompt(sub_cmd, target_lang, [text for text, _, _ in batch]))
+                if response.candidates:
+                    results = self.parse_answer(response.text, len(batch))
+                self.batches += 1
+            except Exception as e:
+                print(f"Warning: Batched {sub_cmd} request failed, retrying individually: {e}")
+            if results is None:
+                self.fallbacks += 1
+
+        if results is None:
+            results = await asyncio.gather(*(self._single(prompt) for _, prompt, _ in batch), return_exceptions=True)
+
+        for (_, _, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+ask_batcher = None  # Created on first use when ASK_BATCHING is enabled
+
+
+def get_ask_batcher(userbot_instance) -> Optional[AskBatcher]:
+    global ask_batcher
+    if ask_batcher is None and userbot_instance.config.ASK_BATCHING:
+        ask_batcher = AskBatcher(userbot_instance.gemini_gateway, userbot_instance.config.ASK_BATCH_WINDOW_MS / 1000)
+    return ask_batcher
+
+
+def model_name_of(userbot_instance) -> str:
+    return getattr(userbot_instance.gemini_model, "model_name", "")
+
+
+async def cached_answer(userbot_instance, sub_cmd: str, text: str, target_lang: Optional[str], prompt: str) -> Optional[str]:
+    """
+    Gemini's answer to `prompt`, served from the response cache when the same request was
+    answered before. Returns None if the model produced no candidates (nothing is cached then).
+    """
+    cache = get_response_cache(userbot_instance)
+    model_name = model_name_of(userbot_instance)
+    answer = cache.lookup(sub_cmd, text, target_lang, model_name)
+    if answer is not None:
+        return answer
+
+    batcher = get_ask_batcher(userbot_instance)
+    if batcher and sub_cmd in ("g", "t"):
+        # Share one model call with other grammar/translation requests arriving right now
+        answer = await batcher.submit(sub_cmd, text, target_lang, prompt)
+    else:
+        response = await userbot_instance.gemini_gateway.generate(prompt)
+        answer = response.text if response.candidates else None
+    if answer is None:
+        return None
+    cache.remember(sub_cmd, text, target_lang, model_name, answer)
+    return answer
+
+# Streaming answers are shown by editing one reply; Telegram rate-limits edits, so they are coalesced
+# here and paced/flood-protected by the userbot's edit scheduler
+STREAM_EDIT_INTERVAL = 1.5  # Minimum seconds between two edits of the same message
+STREAM_TIMEOUT = 120  # Seconds a streamed answer may take in total, including queueing
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+
+def clean_ai_text(text: str) -> str:
+    # Clean up AI-specific phrases (already present, ensuring robustness)
+    return text.replace("AI output:", "").replace("Envo response:", "").strip()
+
+
+async def stream_answer(userbot_instance, client: Client, chat_id: int, prompt: str, prefix: str = "✨ "):
+    """
+    Generate a Gemini answer with streaming and progressively edit a single reply message
+    as chunks arrive. Edits are coalesced to one per STREAM_EDIT_INTERVAL; the final text
+    always lands, with any overflow beyond Telegram's message limit sent as extra messages.
+    Returns the complete answer text.
+    """
+    loop = asyncio.get_running_loop()
+    chunks = asyncio.Queue()
+
+    def produce():
+        # generate_content(stream=True) is a blocking iterator, so drain it in a worker thread
+        try:
+            for chunk in userbot_instance.gemini_model.generate_content(prompt, stream=True):
+                if chunk.candidates and chunk.text:
+                    loop.call_soon_threadsafe(chunks.put_nowait, chunk.text)
+        except Exception as e:
+            loop.call_soon_threadsafe(chunks.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(chunks.put_nowait, None)
+
+    def on_producer_done(task: asyncio.Task):
+        # The gateway may give up (rate limit/deadline) before produce() ever runs
+        if not task.cancelled() and task.exception():
+            chunks.put_nowait(task.exception())
+
+    reply = await client.send_message(chat_id=chat_id, text=f"{prefix}💭")
+    producer = asyncio.create_task(userbot_instance.gemini_gateway.run(produce, timeout=STREAM_TIMEOUT))
+    producer.add_done_callback(on_producer_done)
+
+    answer = ""
+    shown = ""
+    last_edit = 0.0
+    while True:
+        chunk = await chunks.get()
+        if chunk is None:
+            break
+        if isinstance(chunk, Exception):
+            raise chunk
+        answer += chunk
+        text = (prefix + clean_ai_text(answer))[:TELEGRAM_MESSAGE_LIMIT]
+        if text != shown and loop.time() - last_edit >= STREAM_EDIT_INTERVAL:
+            userbot_instance.edit_scheduler.submit(reply, text)
+            shown = text
+            last_edit = loop.time()
+    await producer
+
+    full_text = prefix + (clean_ai_text(answer) or "❌ No response from model.")
+    # The final text always lands, even if intermediate frames were merged away
+    await userbot_instance.edit_scheduler.submit(reply, full_text[:TELEGRAM_MESSAGE_LIMIT])
+    for start in range(TELEGRAM_MESSAGE_LIMIT, len(full_text), TELEGRAM_MESSAGE_LIMIT):
+        await client.send_message(chat_id=chat_id, text=full_text[start:start + TELEGRAM_MESSAGE_LIMIT])
+    return answer
+
+
+wordle_solver = None  # Created on first .analyse (or by the startup warm-up)
+wordle_solver_lock = threading.Lock()
+
+
+def get_wordle_solver():
+    """The shared WordleSolver; the module and its word index are only loaded when first needed."""
+    global wordle_solver
+    with wordle_solver_lock:
+        if wordle_solver is None:
+            from wordle_solver import WordleSolver
+            wordle_solver = WordleSolver()
+    return wordle_solver
+
+# .analyse asks Gemini only to break near-ties between the top local picks, and never waits long
+ANALYSE_TIE_MARGIN = 0.05  # Score difference (bits) still considered a tie
+ANALYSE_GEMINI_TIMEOUT = 3  # Seconds before the local pick is used anyway
+
+
+async def pick_with_gemini(userbot_instance, ranked: list[tuple[str, float]]) -> str:
+    """
+    Return the best locally ranked word, letting Gemini choose among near-ties if it is
+    configured and answers within ANALYSE_GEMINI_TIMEOUT.
+    """
+    best_word, best_score = ranked[0]
+    tied = [word for word, score in ranked if best_score - score <= ANALYSE_TIE_MARGIN]
+    if len(tied) < 2:
+        return best_word
+
+    ai_selection_prompt = (
+        f"{PERSONA_PROMPT}\n\n" # Apply persona here
+        "I'm playing a 5-letter word guessing game. My best options for the next guess are: "
+        f"{', '.join(tied)}. "
+        "Which single word do you think is the MOST LIKELY answer from this list, considering typical word frequencies in such games? "
+        "Just tell me that one 5-letter word, nothing else."
+    )
+
+    async def ask_gemini():
+        # Loading Gemini (first use) counts against the same deadline; if it's cut short the
+        # load still finishes in its thread and is ready for next time
+        if not await userbot_instance.ensure_gemini():
+            return None
+        return await userbot_instance.gemini_gateway.generate(ai_selection_prompt, timeout=ANALYSE_GEMINI_TIMEOUT)
+
+    try:
+        response = await asyncio.wait_for(ask_gemini(), ANALYSE_GEMINI_TIMEOUT)
+        if response is None:
+            return best_word  # Gemini isn't configured
+        selected_word = response.text.strip() if response.candidates else ""
+        selected_word = ''.join(filter(str.isalpha, selected_word)).upper()
+    except Exception as e:
+        # Slow or failing model: the local ranking is already a good answer
+        print(f"Gemini tie-break skipped: {e!r}")
+        return best_word
+    return selected_word if selected_word in tied else best_word # Ensure AI picked from our list
 
 
 async def ask_ai_command(userbot_instance, client: Client, message: Message):
@@ -28,7 +330,7 @@ async def ask_ai_command(userbot_instance, client: Client, message: Message):
     Handle the .ask command for AI interactions.
     Supports general questions, grammar correction, and translation.
     """
-    if not userbot_instance.gemini_model:
+    if not await userbot_instance.ensure_gemini():
         await message.edit_text("❌ Model not configured. Please set `GEMINI_API_KEY` in your environment variables.")
         return
 
@@ -60,8 +362,7 @@ async def ask_ai_command(userbot_instance, client: Client, message: Message):
             # Persona applied to grammar prompt
             prompt = f"{PERSONA_PROMPT}\n\nCorrect the grammar and spelling of the following text. Provide only the corrected text, without any introductory or concluding remarks.\n\nText to correct:\n\"{text_to_correct}\""
             
-            response = await asyncio.to_thread(userbot_instance.gemini_model.generate_content, prompt)
-            corrected_text = response.text if response.candidates else "❌ Could not correct grammar."
+            corrected_text = await cached_answer(userbot_instance, "g", text_to_correct, None, prompt) or "❌ Could not correct grammar."
             
             # Clean up AI-specific phrases (already present, ensuring robustness)
             corrected_text = corrected_text.replace("AI output:", "").replace("Envo response:", "").strip()
@@ -91,8 +392,7 @@ async def ask_ai_command(userbot_instance, client: Client, message: Message):
             # Persona applied to translation prompt
             prompt = f"{PERSONA_PROMPT}\n\nTranslate the following text into {target_lang}. Provide only the translated text, without any introductory or concluding remarks.\n\nText to translate:\n\"{text_to_translate}\""
             
-            response = await asyncio.to_thread(userbot_instance.gemini_model.generate_content, prompt)
-            translated_text = response.text if response.candidates else "❌ Could not translate."
+            translated_text = await cached_answer(userbot_instance, "t", text_to_translate, target_lang, prompt) or "❌ Could not translate."
             
             # Clean up AI-specific phrases (already present, ensuring robustness)
             translated_text = translated_text.replace("AI output:", "").replace("Envo response:", "").strip()
@@ -118,11 +418,20 @@ async def ask_ai_command(userbot_instance, client: Client, message: Message):
             # Persona applied to general question
             full_prompt = f"{PERSONA_PROMPT}\n\nHere's the question I want you to answer:\n{user_question}"
             
-            response = await asyncio.to_thread(userbot_instance.gemini_model.generate_content, full_prompt) 
-            ai_response = response.text if response.candidates else "❌ No response from model."
+            if userbot_instance.config.ASK_STREAMING:
+                cache = get_response_cache(userbot_instance)
+                model_name = model_name_of(userbot_instance)
+                ai_response = cache.lookup("ask", user_question, None, model_name)
+                if ai_response is None:
+                    # Show the answer as it is generated instead of after the whole response
+                    answer = await stream_answer(userbot_instance, client, chat_id, full_prompt)
+                    if answer:
+                        cache.remember("ask", user_question, None, model_name, answer)
+                    return
+            else:
+                ai_response = await cached_answer(userbot_instance, "ask", user_question, None, full_prompt)
             
-            # Clean up AI-specific phrases (already present, ensuring robustness)
-            ai_response = ai_response.replace("AI output:", "").replace("Envo response:", "").strip()
+            ai_response = clean_ai_text(ai_response or "❌ No response from model.")
 
             await client.send_message( # Changed to send_message
                 chat_id=chat_id,
@@ -151,11 +460,9 @@ async def ask_ai_command(userbot_instance, client: Client, message: Message):
 async def analyse_word_command(userbot_instance, client: Client, message: Message):
     """
     Analyzes WordSeekBot game state to guess the secret word using a dedicated solver.
+    Runs locally: the next guess is ranked by expected information gain and a word-frequency
+    table; Gemini (if configured) only breaks near-ties under a tight deadline.
     """
-    if not userbot_instance.gemini_model:
-        await message.edit_text("❌ AI model not configured for analysis. Please set `GEMINI_API_KEY`.")
-        return
-
     game_state_lines = None
     # Check if the command is a reply to a message
     if message.reply_to_message and message.reply_to_message.text:
@@ -179,34 +486,18 @@ async def analyse_word_command(userbot_instance, client: Client, message: Messag
     await client.edit_message_text(chat_id=chat_id, message_id=original_message_id, text="🧠 Analyzing game state... Please wait.") # Emoji for thinking/analysis
 
     try:
-        # Use the dedicated WordleSolver for the logic
-        possible_words = wordle_solver.solve(game_state_lines)
+        # Use the dedicated WordleSolver for the logic. The per-chat session keeps the
+        # surviving candidates, so only guess lines added since the last call are applied.
+        solver = wordle_solver or await asyncio.to_thread(get_wordle_solver)
+        possible_words = solver.solve_session(chat_id, game_state_lines)
         
         if possible_words:
-            # If multiple possibilities, ask AI to pick the "most likely" one with the persona
-            # This leverages the AI's natural language understanding and general knowledge
-            # to pick the best word, but only from the logically valid list.
-            if len(possible_words) > 1:
-                ai_selection_prompt = (
-                    f"{PERSONA_PROMPT}\n\n" # Apply persona here
-                    "I'm playing a 5-letter word guessing game. Based on my previous guesses, the possible secret words are now narrowed down to these options: "
-                    f"{', '.join(possible_words)}. "
-                    "Which single word do you think is the MOST LIKELY answer from this list, considering typical word frequencies in such games? "
-                    "Just tell me that one 5-letter word, nothing else."
-                )
-                response = await asyncio.wait_for(
-                    asyncio.to_thread(userbot_instance.gemini_model.generate_content, ai_selection_prompt),
-                    timeout=15 # Shorter timeout for AI selection
-                )
-                selected_word = response.text.strip() if response.candidates else ""
-                selected_word = ''.join(filter(str.isalpha, selected_word)).upper()
-                
-                if selected_word in possible_words: # Ensure AI picked from our list
-                    final_word = selected_word
-                else: # Fallback if AI gets it wrong or returns garbage
-                    final_word = possible_words[0] # Just pick the first one as a default fallback
-            else: # Only one possibility, it's the final word
-                final_word = possible_words[0]
+            # If multiple possibilities, rank guesses by how well they split the remaining candidates
+            # (expected information gain over the precomputed feedback-pattern matrix) and by how
+            # common each candidate is. Only one possibility means it's the final word.
+            # Off the event loop: the first call may still have to build the matrix cache file.
+            ranked = await asyncio.to_thread(solver.rank_guesses, possible_words)
+            final_word = await pick_with_gemini(userbot_instance, ranked)
 
         else: # No possible words returned by solver
             final_word = None
@@ -223,12 +514,6 @@ async def analyse_word_command(userbot_instance, client: Client, message: Messag
                      "\n\nMake sure the input format is correct (emojis followed by word, one guess per line)."
             )
 
-    except asyncio.TimeoutError:
-        await client.send_message( # Changed to send_message
-            chat_id=chat_id,
-            text="⏳ Analysis timed out. The AI took too long to select the best word. Please try again or provide more precise hints."
-        )
-        await userbot_instance.log_error(f"Analysis timed out for message: {message.text}", message)
     except Exception as e:
         error_trace = traceback.format_exc()
         print(f"Error in analyse_word_command: {e}\n{error_trace}")
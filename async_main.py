@@ -0,0 +1,99 @@
+"""
+Single-event-loop entry point: `python async_main.py`.
+Serves the health, status and metrics routes from a small asyncio HTTP server on the same
+loop as the Pyrogram client, instead of Flask's threaded server next to the bot's thread.
+"""
+
+import asyncio
+import os
+from userbot import TelegramUserbot
+from metrics import metrics
+from owner_ipc import acquire_owner_lock
+
+OWNER_LOCK_FILE = os.environ.get('USERBOT_LOCK_FILE', '/tmp/quoboenvo-userbot.lock')
+MAX_HEADER_LINES = 100
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+class StatusServer:
+    """Minimal HTTP/1.1 server (GET/HEAD, one request per connection) for the bot's read-only routes."""
+
+    def __init__(self, userbot: TelegramUserbot):
+        self.userbot = userbot
+        self.routes = {
+            "/": (lambda: self.userbot.status_publisher.current.health_json, "application/json"),
+            "/status": (lambda: self.userbot.status_publisher.current.status_json, "application/json"),
+            "/metrics": (metrics.render, "text/plain; version=0.0.4"),
+        }
+
+    async def start(self, host: str, port: int):
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            try:
+                status, body, content_type, method = await self.respond(reader)
+            except ValueError:  # A request or header line over the stream limit (64 KiB)
+                status, body, content_type, method = 400, b"", "text/plain", "GET"
+            head = (
+                f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n"
+            )
+            writer.write(head.encode() + (body if method != "HEAD" else b""))
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        except Exception as e:
+            print(f"Warning: Status request failed: {e}")
+        finally:
+            writer.close()
+
+    async def respond(self, reader: asyncio.StreamReader):
+        request_line = await asyncio.wait_for(reader.readline(), 10)
+        parts = request_line.decode("latin-1").split()
+        if len(parts) != 3:
+            return 400, b"", "text/plain", "GET"
+        method, target, _ = parts
+
+        # Headers are not needed, but must be read off the socket
+        for _ in range(MAX_HEADER_LINES):
+            line = await asyncio.wait_for(reader.readline(), 10)
+            if line in (b"\r\n", b"\n", b""):
+                break
+
+        if method not in ("GET", "HEAD"):
+            return 405, b"", "text/plain", method
+        route = self.routes.get(target.split("?", 1)[0])
+        if route is None:
+            return 404, b'{"error": "not found"}', "application/json", method
+        render, content_type = route
+        try:
+            body = render().encode()
+        except Exception as e:
+            print(f"Warning: Could not render {target}: {e}")
+            return 500, b'{"error": "internal error"}', "application/json", method
+        return 200, body, content_type, method
+
+
+async def run():
+    userbot = TelegramUserbot()
+    port = int(os.environ.get('PORT', 5000))
+    await StatusServer(userbot).start('0.0.0.0', port)
+    print(f"✅ Serving /, /status and /metrics on port {port}")
+    await userbot.start()
+
+
+def main():
+    # Same owner lock as main.py, so this never runs next to another process's client
+    owner_lock = acquire_owner_lock(OWNER_LOCK_FILE)
+    try:
+        asyncio.run(run())
+    finally:
+        owner_lock.close()
+
+
+if __name__ == "__main__":
+    main()
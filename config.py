@@ -7,6 +7,34 @@ class Config:
     def __init__(self):
         self.SESSION_STRING = os.getenv('SESSION_STRING', '')
         self.GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', '') # <--- ADD THIS LINE
+        self.QUOTE_MAX_IN_FLIGHT = int(os.getenv('QUOTE_MAX_IN_FLIGHT', '3'))  # Concurrent QuotLyBot requests
+        self.QUOTE_CACHE_SIZE = int(os.getenv('QUOTE_CACHE_SIZE', '512'))  # Rendered quotes kept in memory
+        self.QUOTE_CACHE_TTL = int(os.getenv('QUOTE_CACHE_TTL', str(7 * 24 * 3600)))  # Seconds
+        self.QUOTE_CACHE_DB = os.getenv('QUOTE_CACHE_DB', '')  # Optional SQLite file so the cache survives restarts
+        self.ASK_STREAMING = os.getenv('ASK_STREAMING', '1') != '0'  # Stream .ask answers with progressive edits
+        self.ASK_CACHE_SIZE = int(os.getenv('ASK_CACHE_SIZE', '1024'))  # Cached .ask answers kept in memory
+        self.ASK_CACHE_TTL = int(os.getenv('ASK_CACHE_TTL', str(24 * 3600)))  # Seconds
+        self.ASK_CACHE_DB = os.getenv('ASK_CACHE_DB', '')  # Optional SQLite file so cached answers survive restarts
+        self.GEMINI_MAX_WORKERS = int(os.getenv('GEMINI_MAX_WORKERS', '4'))  # Threads reserved for model calls
+        self.GEMINI_RPM = float(os.getenv('GEMINI_RPM', '15'))  # Model requests per minute
+        self.GEMINI_TIMEOUT = float(os.getenv('GEMINI_TIMEOUT', '60'))  # Seconds per request, queueing included
+        self.ASK_BATCHING = os.getenv('ASK_BATCHING', '0') == '1'  # Merge concurrent .ask g/.ask t requests
+        self.ASK_BATCH_WINDOW_MS = int(os.getenv('ASK_BATCH_WINDOW_MS', '30'))  # How long to gather a batch
+        self.EDIT_MIN_INTERVAL = float(os.getenv('EDIT_MIN_INTERVAL', '0.5'))  # Seconds between edits in one chat
+        self.STATE_DB = os.getenv('STATE_DB', '')  # Optional SQLite file for runtime state instead of state.json
+        self.QUOTE_JOURNAL_FILE = os.getenv('QUOTE_JOURNAL_FILE', 'quote_journal.log')  # Write-ahead log of in-flight auto-quotes
+        self.QUOTLY_DEFAULT_COLOR = os.getenv('QUOTLY_DEFAULT_COLOR', '#1b1429')  # QuotLyBot's own background, sent for the "default" color
+        self.LOCAL_QUOTE_RENDERER = os.getenv('LOCAL_QUOTE_RENDERER', '0') == '1'  # Draw quotes with Pillow before asking QuotLyBot
+        self.QUOTE_FONT = os.getenv('QUOTE_FONT', 'DejaVuSans.ttf')
+        self.QUOTE_BOLD_FONT = os.getenv('QUOTE_BOLD_FONT', 'DejaVuSans-Bold.ttf')  # Sender names
+        self.QUOTE_EMOJI_FONT = os.getenv('QUOTE_EMOJI_FONT', '')  # Color emoji font (e.g. NotoColorEmoji.ttf); emoji go to QuotLyBot without it
+        self.RECONNECT_MAX_DELAY = float(os.getenv('RECONNECT_MAX_DELAY', '60'))  # Backoff cap between reconnect attempts
+        self.HEALTH_PROBE_INTERVAL = float(os.getenv('HEALTH_PROBE_INTERVAL', '30'))  # Seconds between connection probes
+        self.HEALTH_PROBE_TIMEOUT = float(os.getenv('HEALTH_PROBE_TIMEOUT', '10'))
+        self.HEALTH_PROBE_FAILURES = int(os.getenv('HEALTH_PROBE_FAILURES', '3'))  # Failed probes in a row before reconnecting
+        self.WARMUP_ON_START = os.getenv('WARMUP_ON_START', '1') == '1'  # Load Gemini/solver in the background after connecting
+        self.STATUS_REFRESH_INTERVAL = float(os.getenv('STATUS_REFRESH_INTERVAL', '1'))  # Seconds between /status snapshots
+        self.ERROR_DIGEST_INTERVAL = float(os.getenv('ERROR_DIGEST_INTERVAL', '30'))  # Seconds errors are batched before a digest
         
         self._validate_config()
     
@@ -0,0 +1,102 @@
+"""
+Rate-limit-aware scheduler for message edits.
+Frame-based commands (animations, streamed answers) submit the text they want shown; the
+scheduler spaces edits per chat, merges frames that fall behind, and honours FLOOD_WAIT globally.
+"""
+
+import asyncio
+from collections import OrderedDict
+from pyrogram.errors import FloodWait, MessageNotModified
+from pyrogram.types import Message
+from metrics import metrics
+
+
+class EditScheduler:
+    def __init__(self, min_interval: float = 0.5):
+        self.min_interval = min_interval  # Seconds between two edits in the same chat
+        self.pending = {}  # chat id -> OrderedDict(message id -> (message, text, futures))
+        self.workers = {}  # chat id -> worker task
+        self.next_edit = {}  # chat id -> loop time of the next allowed edit
+        self.paused_until = 0.0  # FLOOD_WAIT applies to the whole account
+        self.merged = 0
+        self.flood_waits = 0
+
+    def submit(self, message: Message, text: str) -> asyncio.Future:
+        """
+        Ask for `message` to show `text`. A frame still waiting for its turn is replaced by
+        the newer one. The returned future resolves to True once this text (or a newer one)
+        is shown, or to False if the edit failed.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        chat_id = message.chat.id
+        queue = self.pending.setdefault(chat_id, OrderedDict())
+        if message.id in queue:
+            self.merged += 1
+            futures = queue[message.id][2] + [future]
+        else:
+            futures = [future]
+        queue[message.id] = (message, text, futures)
+
+        worker = self.workers.get(chat_id)
+        if worker is None or worker.done():
+            self.workers[chat_id] = asyncio.create_task(self._run(chat_id))
+        return future
+
+    async def play(self, message: Message, frames: list[str], interval: float) -> bool:
+        """
+        Show `frames` one after another, `interval` seconds apart. Frames the chat can't keep
+        up with are merged away; the last frame always lands. Returns whether it did.
+        """
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for i, frame in enumerate(frames[:-1]):
+            self.submit(message, frame)
+            await asyncio.sleep(max(0.0, start + (i + 1) * interval - loop.time()))
+        return await self.submit(message, frames[-1])
+
+    async def _run(self, chat_id: int):
+        loop = asyncio.get_running_loop()
+        queue = self.pending[chat_id]
+        while queue:
+            wait = max(self.next_edit.get(chat_id, 0.0), self.paused_until) - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+
+            message_id, (message, text, futures) = queue.popitem(last=False)
+            try:
+                await message.edit_text(text)
+                landed = True
+            except FloodWait as e:
+                self.flood_waits += 1
+                metrics.flood_wait(e.value, "edits")
+                self.paused_until = max(self.paused_until, loop.time() + e.value)
+                print(f"⚠️ FLOOD_WAIT of {e.value}s on message edits, pausing all edits")
+                if message_id in queue:
+                    # A newer frame arrived meanwhile: it replaces this one
+                    newer = queue[message_id]
+                    queue[message_id] = (newer[0], newer[1], futures + newer[2])
+                else:
+                    queue[message_id] = (message, text, futures)
+                queue.move_to_end(message_id, last=False)
+                continue
+            except MessageNotModified:
+                landed = True
+            except Exception as e:
+                print(f"Warning: Could not edit message {message_id} in chat {chat_id}: {e}")
+                landed = False
+
+            for future in futures:
+                if not future.done():
+                    future.set_result(landed)
+            self.next_edit[chat_id] = loop.time() + self.min_interval
+
+        del self.pending[chat_id]
+
+    def stats(self) -> dict:
+        return {
+            "pending": sum(len(queue) for queue in self.pending.values()),
+            "merged_frames": self.merged,
+            "flood_waits": self.flood_waits,
+        }
@@ -0,0 +1,99 @@
+"""
+Batched error reporting to Saved Messages.
+Errors are grouped by exception type and call site; a background worker sends one digest
+per window with counts and a few samples, so a failure cascade (e.g. QuotLyBot being down)
+can't turn into a notification storm or FLOOD_WAITs.
+"""
+
+import asyncio
+import time
+from pyrogram import Client
+from pyrogram.errors import FloodWait
+from metrics import metrics
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+
+class ErrorReporter:
+    def __init__(self, flush_interval: float = 30.0, max_groups: int = 50, max_samples: int = 3):
+        self.flush_interval = flush_interval  # Seconds errors are gathered before a digest is sent
+        self.max_groups = max_groups  # Distinct (type, site) groups kept per window; more are only counted
+        self.max_samples = max_samples  # Sample messages kept per group
+        self.groups = {}  # (error type, call site) -> {"count", "first", "last", "samples"}
+        self.dropped = 0  # Errors that didn't fit in the window's groups
+        self.reported = 0
+        self.digests = 0
+        self.me = None  # Own user, fetched once
+        self.client = None
+        self.task = None
+
+    def report(self, error_type: str, site: str, text: str):
+        """Queue an error for the next digest. Never blocks and never does I/O."""
+        self.reported += 1
+        now = time.time()
+        key = (error_type, site)
+        group = self.groups.get(key)
+        if group is None:
+            if len(self.groups) >= self.max_groups:
+                self.dropped += 1
+                return
+            group = self.groups[key] = {"count": 0, "first": now, "last": now, "samples": []}
+        group["count"] += 1
+        group["last"] = now
+        if len(group["samples"]) < self.max_samples:
+            group["samples"].append(text)
+
+    def start(self, client: Client):
+        """Start the digest loop; call from the running event loop once the client is started."""
+        self.client = client
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def build_digest(self, groups: dict, dropped: int) -> str:
+        total = sum(group["count"] for group in groups.values()) + dropped
+        lines = [f"🚨 **Userbot Errors** ({total} in the last {int(self.flush_interval)}s)"]
+        for (error_type, site), group in sorted(groups.items(), key=lambda item: -item[1]["count"]):
+            lines.append(f"\n**{error_type}** in `{site}` × {group['count']}")
+            for sample in group["samples"]:
+                lines.append(f"• {sample[:500]}")
+        if dropped:
+            lines.append(f"\n…and {dropped} more errors of other kinds")
+        digest = "\n".join(lines)
+        if len(digest) > TELEGRAM_MESSAGE_LIMIT:
+            digest = digest[:TELEGRAM_MESSAGE_LIMIT - 1] + "…"
+        return digest
+
+    async def flush(self):
+        """Send everything gathered so far as one message, retrying after FLOOD_WAIT."""
+        if not self.groups or not self.client:
+            return
+        # Take the window; errors arriving while we send go into the next digest
+        groups, dropped = self.groups, self.dropped
+        self.groups, self.dropped = {}, 0
+        digest = self.build_digest(groups, dropped)
+        while True:
+            try:
+                if self.me is None:
+                    self.me = await self.client.get_me()
+                await self.client.send_message(self.me.id, digest)
+                self.digests += 1
+                return
+            except FloodWait as e:
+                metrics.flood_wait(e.value, "error_digest")
+                print(f"⚠️ FLOOD_WAIT while sending error digest, retrying in {e.value}s")
+                await asyncio.sleep(e.value)
+            except Exception as e:
+                print(f"Failed to log error: {e}")
+                return
+
+    def stats(self) -> dict:
+        return {
+            "reported": self.reported,
+            "digests": self.digests,
+            "pending_groups": len(self.groups),
+        }
@@ -0,0 +1,126 @@
+"""
+Gateway for all Gemini model calls.
+Runs the blocking SDK calls on a dedicated, bounded thread pool and paces them with a
+token bucket, so AI load can neither starve the default executor nor burst past the API quota.
+"""
+
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from metrics import metrics
+
+
+class TokenBucket:
+    """
+    Requests-per-minute limiter; waiters are served in arrival order.
+    A caller reserves its token up front (the balance may go negative) and sleeps until it's
+    paid off, so nobody waits behind a lock and each caller checks only its own deadline.
+    """
+
+    def __init__(self, requests_per_minute: float, burst: Optional[int] = None):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = burst or max(1, int(requests_per_minute // 4))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, deadline: float) -> bool:
+        """Take one token, waiting until `deadline` (monotonic time) at most. Returns False on timeout."""
+        self._refill()
+        wait = max(0.0, (1 - self.tokens) / self.rate)
+        if time.monotonic() + wait > deadline:
+            return False
+        self.tokens -= 1  # Reserved: later callers queue behind this one
+        try:
+            await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            self.tokens += 1  # Never used: hand the reservation back
+            raise
+        return True
+
+    def penalize(self, seconds: float):
+        """Push the bucket into debt after a 429 so the next requests back off smoothly."""
+        self._refill()
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+
+class GeminiGateway:
+    def __init__(self, model, max_workers: int = 4, requests_per_minute: float = 15, default_timeout: float = 60):
+        self.model = model
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gemini")
+        self.bucket = TokenBucket(requests_per_minute)
+        self.default_timeout = default_timeout
+        self.queued = 0
+        self.in_flight = 0
+        self.timeouts = 0
+        self.rate_limited = 0
+        self.last_success = None  # Unix time of the last successful call
+
+    async def run(self, func, *args, timeout: Optional[float] = None, **kwargs):
+        """
+        Run a blocking model call on the gateway's pool once the rate limiter allows it.
+        The whole request (queueing + call) must finish within `timeout` seconds, otherwise
+        asyncio.TimeoutError is raised; calls that have not started yet are cancelled.
+        """
+        timeout = self.default_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        outcome = "error"
+        try:
+            result = await self._run(func, args, kwargs, deadline)
+            outcome = "ok"
+            return result
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            raise
+        finally:
+            metrics.observe("gemini_request_seconds", time.monotonic() - started)
+            metrics.inc("gemini_requests_total", (("outcome", outcome),))
+
+    async def _run(self, func, args: tuple, kwargs: dict, deadline: float):
+        self.queued += 1
+        try:
+            allowed = await self.bucket.acquire(deadline)
+        finally:
+            self.queued -= 1
+        if not allowed:
+            self.timeouts += 1
+            raise asyncio.TimeoutError("Gemini request is still rate limited at its deadline")
+
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+        try:
+            call = loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+            result = await asyncio.wait_for(call, max(0.0, deadline - time.monotonic()))
+            self.last_success = time.time()
+            return result
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        except Exception as e:
+            if type(e).__name__ in ("ResourceExhausted", "TooManyRequests") or "429" in str(e):
+                # API quota hit: slow everyone down instead of failing the next requests too
+                self.rate_limited += 1
+                self.bucket.penalize(30)
+            raise
+        finally:
+            self.in_flight -= 1
+
+    async def generate(self, prompt: str, timeout: Optional[float] = None, **kwargs):
+        """generate_content through the gateway."""
+        return await self.run(self.model.generate_content, prompt, timeout=timeout, **kwargs)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "timeouts": self.timeouts,
+            "rate_limited": self.rate_limited,
+            "last_success": self.last_success,
+        }
@@ -6,34 +6,55 @@ This file starts both the Flask web server and the Pyrogram userbot.
 import asyncio
 import threading
 import os
-from flask import Flask, jsonify
+from flask import Flask, Response
 from userbot import TelegramUserbot
+from metrics import metrics
+from status_snapshot import STARTING_SNAPSHOT, StatusPublisher
+from owner_ipc import acquire_owner_lock, start_ipc_server, query_owner
+
+# Only one process (the lock holder) runs the Telegram client; other workers ask it over IPC
+OWNER_LOCK_FILE = os.environ.get('USERBOT_LOCK_FILE', '/tmp/quoboenvo-userbot.lock')
+OWNER_SOCKET = os.environ.get('USERBOT_SOCKET', '/tmp/quoboenvo-userbot.sock')
 
 # Initialize Flask app for Render web service requirement
 app = Flask(__name__)
 
-# Global userbot instance
+# Global userbot instance (set only in the process that owns the Telegram client)
 userbot_instance = None
+owner_lock = None
+userbot_thread = None
+
+# Served by workers that can't reach the owner process
+UNREACHABLE_SNAPSHOT = StatusPublisher.build({"userbot_running": False, "connection": "owner_unreachable", "auto_quote_mode": False})
+
+def current_snapshot():
+    """Latest status published by the bot's event loop (never reads live bot attributes)."""
+    return userbot_instance.status_publisher.current if userbot_instance else STARTING_SNAPSHOT
+
+def owner_view(name: str, local, fallback: str) -> str:
+    """Render a view here if this process owns the userbot, otherwise fetch it from the owner."""
+    if owner_lock is not None:
+        return local()
+    body = query_owner(OWNER_SOCKET, name)
+    return body if body is not None else fallback
 
 @app.route('/')
 def health_check():
     """Health check endpoint for Render deployment."""
-    return jsonify({
-        "status": "running",
-        "service": "telegram_userbot",
-        "auto_quote_enabled": userbot_instance.auto_quote_enabled if userbot_instance else False
-    })
+    body = owner_view("health", lambda: current_snapshot().health_json, UNREACHABLE_SNAPSHOT.health_json)
+    return Response(body, mimetype="application/json")
 
 @app.route('/status')
 def status():
     """Status endpoint showing userbot information."""
-    if userbot_instance:
-        return jsonify({
-            "userbot_running": userbot_instance.is_connected if hasattr(userbot_instance, 'is_connected') else False,
-            "auto_quote_mode": userbot_instance.auto_quote_enabled,
-            "current_color": userbot_instance.current_color
-        })
-    return jsonify({"userbot_running": False})
+    body = owner_view("status", lambda: current_snapshot().status_json, UNREACHABLE_SNAPSHOT.status_json)
+    return Response(body, mimetype="application/json")
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape endpoint: handler latency histograms, counters, in-flight gauges, FLOOD_WAIT totals."""
+    body = owner_view("metrics", metrics.render, "")
+    return Response(body, mimetype="text/plain; version=0.0.4")
 
 def run_flask():
     """Run Flask server in a separate thread."""
@@ -41,15 +62,43 @@ def run_flask():
     app.run(host='0.0.0.0', port=port, debug=False)
 
 async def run_userbot():
-    """Run the Telegram userbot."""
+    """Run the Telegram userbot and answer other workers' status/metrics queries."""
     global userbot_instance
     userbot_instance = TelegramUserbot()
+    await start_ipc_server(OWNER_SOCKET, {
+        "health": lambda: current_snapshot().health_json,
+        "status": lambda: current_snapshot().status_json,
+        "metrics": metrics.render,
+    })
     await userbot_instance.start()
 
 def start_userbot_background():
-    """Start userbot in background thread for Gunicorn."""
+    """
+    Start the userbot in a background thread once this process holds the owner lock.
+    Under Gunicorn every worker calls this; one becomes the owner, the others wait on the
+    lock and take over if the owner dies.
+    """
+    global userbot_thread
+    if userbot_thread is not None:
+        return
+    
     def run_async():
-        asyncio.run(run_userbot())
+        global owner_lock
+        lock = acquire_owner_lock(OWNER_LOCK_FILE)  # Blocks while another process owns the client
+        owner_lock = lock
+        print(f"✅ Process {os.getpid()} owns the Telegram client")
+        try:
+            asyncio.run(run_userbot())
+        except Exception as e:
+            print(f"⚠️ Userbot stopped: {e}")
+        finally:
+            # Hand ownership over: a waiting worker takes the lock and serves a fresh socket
+            owner_lock = None
+            try:
+                os.unlink(OWNER_SOCKET)
+            except FileNotFoundError:
+                pass
+            lock.close()
     
     userbot_thread = threading.Thread(target=run_async, daemon=True)
     userbot_thread.start()
@@ -60,8 +109,9 @@ def main():
     flask_thread = threading.Thread(target=run_flask, daemon=True)
     flask_thread.start()
     
-    # Run userbot in the main thread
-    asyncio.run(run_userbot())
+    # The userbot already runs in the background (started on import); keep the process alive with it
+    start_userbot_background()
+    userbot_thread.join()
 
 # Initialize userbot when module is imported (for Gunicorn)
 start_userbot_background()
@@ -0,0 +1,177 @@
+"""
+Lightweight in-process metrics, rendered in the Prometheus text format for /metrics.
+All updates happen on the bot's event loop thread as plain dict/int operations (no locks);
+the web thread only takes snapshots when rendering.
+"""
+
+import bisect
+import time
+from typing import Dict, Tuple
+from pyrogram.errors import FloodWait
+
+# Seconds; covers fast cached replies up to slow QuotLyBot/Gemini round trips
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Per bucket (not cumulative); last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Track:
+    """Times one handler run: in-flight gauge, latency histogram, outcome counter, FLOOD_WAIT totals."""
+    __slots__ = ("metrics", "labels", "started")
+
+    def __init__(self, metrics: "Metrics", handler: str):
+        self.metrics = metrics
+        self.labels = (("handler", handler),)
+
+    async def __aenter__(self):
+        self.metrics.gauge_add("userbot_handler_in_flight", 1, self.labels)
+        self.started = time.perf_counter()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        metrics = self.metrics
+        metrics.observe("userbot_handler_duration_seconds", time.perf_counter() - self.started, self.labels)
+        metrics.gauge_add("userbot_handler_in_flight", -1, self.labels)
+        outcome = "ok" if exc_type is None else "error"
+        metrics.inc("userbot_handler_calls_total", self.labels + (("outcome", outcome),))
+        if isinstance(exc, FloodWait):
+            metrics.flood_wait(exc.value, self.labels[0][1])
+        return False
+
+
+class Metrics:
+    HELP = {
+        "userbot_handler_duration_seconds": ("histogram", "Time spent in a message handler"),
+        "userbot_handler_calls_total": ("counter", "Handler runs by outcome"),
+        "userbot_handler_in_flight": ("gauge", "Handler runs currently in progress"),
+        "userbot_flood_wait_total": ("counter", "FLOOD_WAIT errors received from Telegram"),
+        "userbot_flood_wait_seconds_total": ("counter", "Seconds of FLOOD_WAIT imposed by Telegram"),
+        "quotly_response_seconds": ("histogram", "Time QuotLyBot took to answer a request"),
+        "quotly_timeouts_total": ("counter", "QuotLyBot requests that got no answer in time"),
+        "gemini_request_seconds": ("histogram", "Gemini call latency through the gateway, queueing included"),
+        "gemini_requests_total": ("counter", "Gemini calls by outcome"),
+        "userbot_startup_phase_seconds": ("gauge", "Duration of each startup and warm-up phase"),
+    }
+
+    def __init__(self):
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        self.gauges: Dict[str, Dict[Labels, float]] = {}
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+
+    def inc(self, name: str, labels: Labels = (), value: float = 1):
+        series = self.counters.setdefault(name, {})
+        series[labels] = series.get(labels, 0) + value
+
+    def gauge_add(self, name: str, value: float, labels: Labels = ()):
+        series = self.gauges.setdefault(name, {})
+        series[labels] = series.get(labels, 0) + value
+
+    def gauge_set(self, name: str, value: float, labels: Labels = ()):
+        self.gauges.setdefault(name, {})[labels] = value
+
+    def observe(self, name: str, value: float, labels: Labels = ()):
+        series = self.histograms.setdefault(name, {})
+        histogram = series.get(labels)
+        if histogram is None:
+            histogram = series[labels] = Histogram()
+        histogram.observe(value)
+
+    def flood_wait(self, seconds: float, where: str):
+        labels = (("where", where),)
+        self.inc("userbot_flood_wait_total", labels)
+        self.inc("userbot_flood_wait_seconds_total", labels, seconds)
+
+    def track(self, handler: str) -> Track:
+        """`async with metrics.track("name"):` around one handler run."""
+        return Track(self, handler)
+
+    def instrument(self, handler: str):
+        """Decorator form of track() for Pyrogram handlers."""
+        def decorator(func):
+            async def wrapper(*args, **kwargs):
+                async with Track(self, handler):
+                    return await func(*args, **kwargs)
+            wrapper.__name__ = func.__name__
+            wrapper.__doc__ = func.__doc__
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def _format_labels(labels: Labels, extra: str = "") -> str:
+        parts = [f'{key}="{value}"' for key, value in labels]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def _header(self, lines: list, name: str, default_type: str):
+        kind, help_text = self.HELP.get(name, (default_type, name))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        # list(...) snapshots each dict in one step, so the event loop can keep updating meanwhile
+        for name, series in sorted(list(self.counters.items())):
+            self._header(lines, name, "counter")
+            for labels, value in list(series.items()):
+                lines.append(f"{name}{self._format_labels(labels)} {value}")
+        for name, series in sorted(list(self.gauges.items())):
+            self._header(lines, name, "gauge")
+            for labels, value in list(series.items()):
+                lines.append(f"{name}{self._format_labels(labels)} {value}")
+        for name, series in sorted(list(self.histograms.items())):
+            self._header(lines, name, "histogram")
+            for labels, histogram in list(series.items()):
+                counts = list(histogram.counts)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, counts):
+                    cumulative += count
+                    le = f'le="{bound}"'
+                    lines.append(f"{name}_bucket{self._format_labels(labels, le)} {cumulative}")
+                cumulative += counts[-1]
+                inf = 'le="+Inf"'
+                lines.append(f"{name}_bucket{self._format_labels(labels, inf)} {cumulative}")
+                lines.append(f"{name}_sum{self._format_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{self._format_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()  # Process-wide registry
+
+
+class StartupTimer:
+    """Times consecutive startup phases; each one is also exported as a gauge."""
+
+    def __init__(self, name: str = "Startup"):
+        self.name = name
+        self.started = time.perf_counter()
+        self.last = self.started
+        self.phases = []
+
+    def mark(self, phase: str):
+        """End the current phase (started at the previous mark) under the name `phase`."""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        metrics.gauge_set("userbot_startup_phase_seconds", now - self.last, (("phase", phase),))
+        self.last = now
+
+    def report(self):
+        total = self.last - self.started
+        phases = ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in self.phases)
+        print(f"⏱️ {self.name}: {phases} (total {total:.2f}s)")
@@ -0,0 +1,65 @@
+"""
+Single owner of the Telegram client across web worker processes.
+Every Gunicorn worker imports main.py, but only the process holding the owner lock runs
+the userbot; the others serve HTTP and ask the owner for status and metrics over a Unix socket.
+"""
+
+import asyncio
+import fcntl
+import os
+import socket
+from typing import Callable, Dict, Optional
+
+
+def acquire_owner_lock(path: str):
+    """
+    Block until this process holds the exclusive owner lock and return the open lock file
+    (keep a reference: closing it releases the lock). The OS drops the lock when the owner
+    dies, so a waiting worker takes over automatically.
+    """
+    lock_file = open(path, 'a+')
+    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+    lock_file.seek(0)
+    lock_file.truncate()
+    lock_file.write(f"{os.getpid()}\n")
+    lock_file.flush()
+    return lock_file
+
+
+async def start_ipc_server(path: str, views: Dict[str, Callable[[], str]]):
+    """
+    Serve `views` on a Unix socket: a client sends one view name per connection (newline
+    terminated) and reads the body until EOF. Unknown names get an empty body.
+    """
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            name = (await reader.readline()).decode().strip()
+            view = views.get(name)
+            writer.write(view().encode() if view else b"")
+            await writer.drain()
+        except Exception as e:
+            print(f"Warning: IPC request failed: {e}")
+        finally:
+            writer.close()
+
+    if os.path.exists(path):
+        os.unlink(path)  # Left over by a previous owner; we hold the lock, so it's ours now
+    return await asyncio.start_unix_server(handle, path)
+
+
+def query_owner(path: str, name: str, timeout: float = 1.0) -> Optional[str]:
+    """Fetch a view from the owner process; None if it isn't reachable."""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(path)
+            sock.sendall(f"{name}\n".encode())
+            chunks = []
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        return b"".join(chunks).decode()
+    except OSError:
+        return None
@@ -0,0 +1,92 @@
+"""
+Write-ahead journal for in-flight auto-quotes.
+An auto-quote deletes the user's message before QuotLyBot has answered; the message is
+journaled (and fsynced) first, so a crash or redeploy in that window can't lose it.
+Unfinished entries are re-posted on the next start.
+"""
+
+import json
+import os
+import threading
+from typing import Optional
+
+
+class QuoteJournal:
+    def __init__(self, path: str = 'quote_journal.log', compact_after: int = 500):
+        self.path = path
+        self.compact_after = compact_after  # Rewrite the log once it holds this many records
+        self.pending = {}  # key -> {"chat_id", "text", "reply_to"}
+        self.records = 0  # Records in the log file (pending entries + finished ones)
+        self.file = None
+        # begin() and finish() run in worker threads (asyncio.to_thread), so fsyncs, compaction
+        # and waiting for this lock all stay off the event loop
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_key(chat_id: int, message_id: int) -> str:
+        return f"{chat_id}_{message_id}"
+
+    def open(self) -> dict:
+        """Read the existing log (at startup) and return the entries that were never finished."""
+        try:
+            with open(self.path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # Torn last line from a crash mid-append: everything after it is garbage
+                    self.records += 1
+                    if record.get('op') == 'begin':
+                        self.pending[record['key']] = record['entry']
+                    else:
+                        self.pending.pop(record['key'], None)
+        except FileNotFoundError:
+            pass
+        self._compact()  # Start from a clean log holding only the unfinished entries
+        return dict(self.pending)
+
+    def begin(self, chat_id: int, message_id: int, text: str, reply_to: Optional[int] = None) -> str:
+        """Journal a message before it is deleted. Durable (fsynced) when this returns."""
+        key = self.make_key(chat_id, message_id)
+        entry = {"chat_id": chat_id, "text": text, "reply_to": reply_to}
+        with self.lock:
+            self.pending[key] = entry
+            self._append({"op": "begin", "key": key, "entry": entry}, sync=True)
+        return key
+
+    def finish(self, key: str):
+        """Mark an entry as done (quote delivered or message restored). May compact the log."""
+        with self.lock:
+            if self.pending.pop(key, None) is None:
+                return
+            # Flushed but not fsynced: survives a process crash; after a power loss the worst
+            # case is the original being re-posted next to its quote, never a lost message.
+            self._append({"op": "end", "key": key}, sync=False)
+            if self.records >= self.compact_after:
+                self._compact()
+
+    def _append(self, record: dict, sync: bool):
+        if self.file is None:
+            self.file = open(self.path, 'a')
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+        if sync:
+            os.fsync(self.file.fileno())
+        self.records += 1
+
+    def _compact(self):
+        """Atomically replace the log with one `begin` record per unfinished entry."""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            for key, entry in self.pending.items():
+                f.write(json.dumps({"op": "begin", "key": key, "entry": entry}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        if self.file is not None:
+            self.file.close()
+        os.replace(tmp_path, self.path)
+        self.file = open(self.path, 'a')
+        self.records = len(self.pending)
+
+    def stats(self) -> dict:
+        return {"pending": len(self.pending), "records": self.records}
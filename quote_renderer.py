@@ -0,0 +1,313 @@
+"""
+Local QuotLyBot-style quote renderer (optional, needs Pillow).
+Draws the sender's avatar, name and text in a colored bubble and returns a 512px WebP
+sticker, so a quote doesn't have to wait for @QuotLyBot. Glyphs and avatars are cached,
+which keeps repeated renders in the low milliseconds. Anything it can't draw faithfully
+(unknown color, characters missing from the fonts, very long texts) returns None so the
+caller falls back to QuotLyBot.
+"""
+
+import io
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:  # Pillow is optional; without it every quote goes through QuotLyBot
+    Image = None
+
+STICKER_SIZE = 512
+MAX_TEXT_LENGTH = 1000
+AVATAR_SIZE = 64
+
+# Named colors QuotLyBot understands (a subset); "#rrggbb" works too
+COLORS = {
+    "default": (27, 20, 41),
+    "black": (0, 0, 0),
+    "white": (255, 255, 255),
+    "red": (220, 53, 69),
+    "orange": (253, 126, 20),
+    "yellow": (255, 193, 7),
+    "green": (40, 167, 69),
+    "cyan": (23, 162, 184),
+    "blue": (0, 123, 255),
+    "purple": (111, 66, 193),
+    "pink": (232, 62, 140),
+    "brown": (121, 85, 72),
+    "gray": (108, 117, 125),
+    "grey": (108, 117, 125),
+}
+
+# Telegram's name colors, picked by user id
+NAME_COLORS = [(252, 92, 81), (250, 121, 9), (137, 109, 255), (5, 187, 71), (10, 190, 212), (61, 163, 252), (255, 86, 162)]
+
+ZERO_WIDTH = {"‍", "︎", "️"}  # ZWJ and variation selectors: drawn as part of the emoji next to them
+
+
+def is_emoji(char: str) -> bool:
+    """Emoji and pictographs: text fonts like DejaVu draw some of them, but only as flat outlines."""
+    code = ord(char)
+    return (unicodedata.category(char) == "So" or 0x1F000 <= code <= 0x1FAFF
+            or 0x2600 <= code <= 0x27BF or code == 0x20E3)  # 0x20E3: keycap (1️⃣)
+
+
+def parse_color(name: str) -> Optional[tuple]:
+    """RGB for a QuotLyBot color name or #rrggbb, or None if we don't know it."""
+    name = name.strip().lower()
+    if name in COLORS:
+        return COLORS[name]
+    if name.startswith("#") and len(name) == 7:
+        try:
+            return tuple(int(name[i:i + 2], 16) for i in (1, 3, 5))
+        except ValueError:
+            return None
+    return None
+
+
+class QuoteRenderer:
+    def __init__(self, font_path: str = "DejaVuSans.ttf", bold_font_path: str = "DejaVuSans-Bold.ttf",
+                 emoji_font_path: Optional[str] = None, font_size: int = 26,
+                 glyph_cache_size: int = 4096, avatar_cache_size: int = 256):
+        self.enabled = Image is not None
+        self.glyph_cache_size = glyph_cache_size
+        self.avatar_cache_size = avatar_cache_size
+        self.glyphs = OrderedDict()  # (font key, char) -> (mask or RGBA image, advance) or None if missing
+        self.avatars = OrderedDict()  # avatar key -> round RGBA avatar
+        self.lock = threading.Lock()  # Renders run in worker threads
+        self.renders = 0
+        self.render_time = 0.0
+        self.declined = 0
+        if not self.enabled:
+            return
+
+        self.font_size = font_size
+        self.fonts = {
+            "text": self._load_font(font_path, font_size),
+            "name": self._load_font(bold_font_path, font_size),
+        }
+        self.emoji_font = None
+        if emoji_font_path:
+            try:
+                self.emoji_font = ImageFont.truetype(emoji_font_path, 109)  # Color bitmap fonts only come in 109px
+            except OSError as e:
+                print(f"⚠️ Emoji font {emoji_font_path} could not be loaded: {e}")
+        if not hasattr(self.fonts["text"], "getmetrics"):
+            # Old Pillow's fallback bitmap font can't be measured: leave every quote to QuotLyBot
+            print(f"⚠️ Quote font {font_path} not found and no scalable fallback; local quote renderer disabled.")
+            self.enabled = False
+            return
+        ascent, descent = self.fonts["text"].getmetrics()
+        self.line_height = int((ascent + descent) * 1.15)
+        # What the fonts draw for characters they don't have (the .notdef box)
+        self.missing = {key: self._draw_glyph(font, "\U0010fffd")[2] for key, font in self.fonts.items()}
+
+    @staticmethod
+    def _load_font(path: str, size: int):
+        try:
+            return ImageFont.truetype(path, size)
+        except OSError:
+            pass
+        try:
+            return ImageFont.load_default(size)
+        except TypeError:  # Pillow < 10.1: only the small fixed-size bitmap font
+            return ImageFont.load_default()
+
+    def _draw_glyph(self, font, char: str) -> tuple:
+        advance = max(1, round(font.getlength(char)))
+        image = Image.new("L", (advance + 4, self.line_height))
+        ImageDraw.Draw(image).text((0, 0), char, font=font, fill=255)
+        return image, advance, image.tobytes()
+
+    def _glyph(self, font_key: str, char: str):
+        """Cached rendering of one character: (image, advance), or None if no font has it."""
+        key = (font_key, char)
+        glyph = self.glyphs.get(key, False)
+        if glyph is not False:
+            self.glyphs.move_to_end(key)
+            return glyph
+
+        glyph = None
+        if is_emoji(char):
+            # Only drawn with the color emoji font; without one the quote goes to QuotLyBot
+            if self.emoji_font is not None and self.emoji_font.getmask(char).getbbox():
+                glyph = self._emoji_glyph(char)
+        else:
+            image, advance, pixels = self._draw_glyph(self.fonts[font_key], char)
+            if char.isspace() or pixels != self.missing[font_key]:
+                glyph = (image, advance)
+
+        self.glyphs[key] = glyph
+        if len(self.glyphs) > self.glyph_cache_size:
+            self.glyphs.popitem(last=False)
+        return glyph
+
+    def _emoji_glyph(self, char: str) -> tuple:
+        """A color emoji scaled down to the text's line height."""
+        image = Image.new("RGBA", (136, 128))
+        ImageDraw.Draw(image).text((0, 0), char, font=self.emoji_font, embedded_color=True)
+        size = self.line_height - 4
+        return image.resize((size * 136 // 128, size), Image.LANCZOS), size * 136 // 128
+
+    def _measure(self, font_key: str, text: str) -> Optional[int]:
+        width = 0
+        for char in text:
+            if char in ZERO_WIDTH:
+                continue
+            glyph = self._glyph(font_key, char)
+            if glyph is None:
+                return None
+            width += glyph[1]
+        return width
+
+    def _wrap(self, text: str, max_width: int) -> Optional[list]:
+        """Greedy word wrap on cached glyph widths; None if a character can't be drawn."""
+        lines = []
+        space = self._measure("text", " ")
+        for paragraph in text.split("\n"):
+            line, line_width = "", 0
+            for word in paragraph.split(" "):
+                word_width = self._measure("text", word)
+                if word_width is None:
+                    return None
+                if line and line_width + space + word_width <= max_width:
+                    line, line_width = f"{line} {word}", line_width + space + word_width
+                    continue
+                if line:
+                    lines.append(line)
+                line, line_width = "", 0
+                while word_width > max_width:  # A word longer than a line: break it by characters
+                    cut = 1
+                    while cut < len(word) - 1 and self._measure("text", word[:cut + 1]) <= max_width:
+                        cut += 1
+                    lines.append(word[:cut])
+                    word = word[cut:]
+                    word_width = self._measure("text", word)
+                line, line_width = word, word_width
+            lines.append(line)
+        return lines
+
+    def _draw_text(self, canvas, font_key: str, text: str, x: int, y: int, color: tuple):
+        for char in text:
+            if char in ZERO_WIDTH:
+                continue
+            image, advance = self._glyph(font_key, char)
+            if image.mode == "RGBA":
+                canvas.alpha_composite(image, (x, y + 2))
+            else:
+                canvas.paste(color + (255,), (x, y, x + image.width, y + image.height), image)
+            x += advance
+
+    def _avatar(self, avatar_key, avatar_bytes: Optional[bytes], name: str, name_color: tuple, size: int):
+        key = (avatar_key, size)
+        avatar = self.avatars.get(key) if avatar_key is not None else None
+        if avatar is not None:
+            self.avatars.move_to_end(key)
+            return avatar
+
+        mask = Image.new("L", (size, size))
+        ImageDraw.Draw(mask).ellipse((0, 0, size - 1, size - 1), fill=255)
+        if avatar_bytes:
+            photo = Image.open(io.BytesIO(avatar_bytes)).convert("RGBA").resize((size, size), Image.LANCZOS)
+        else:
+            # No profile photo: initial on the name color, like Telegram
+            photo = Image.new("RGBA", (size, size), name_color + (255,))
+            initial = (name.strip()[:1] or "?").upper()
+            font = self.fonts["name"]
+            ImageDraw.Draw(photo).text((size / 2, size / 2), initial, font=font, fill="white", anchor="mm")
+        avatar = Image.new("RGBA", (size, size))
+        avatar.paste(photo, (0, 0), mask)
+
+        if avatar_key is not None:
+            self.avatars[key] = avatar
+            if len(self.avatars) > self.avatar_cache_size:
+                self.avatars.popitem(last=False)
+        return avatar
+
+    def has_avatar(self, avatar_key) -> bool:
+        """Whether the avatar is cached, i.e. its photo doesn't need downloading."""
+        return (avatar_key, AVATAR_SIZE) in self.avatars
+
+    def render(self, name: str, text: str, color: str, user_id: int = 0,
+               avatar_bytes: Optional[bytes] = None, avatar_key=None) -> Optional[bytes]:
+        """
+        Render a quote sticker (WebP bytes). `avatar_key` identifies the avatar image (e.g. the
+        photo's unique id) so it's decoded and masked only once. Returns None when the quote
+        should go to QuotLyBot instead.
+        """
+        if not self.enabled:
+            return None
+        bubble_color = parse_color(color)
+        if bubble_color is None or not text.strip() or len(text) > MAX_TEXT_LENGTH:
+            self.declined += 1
+            return None
+
+        started = time.perf_counter()
+        with self.lock:
+            image = self._render(name or "Deleted Account", text, bubble_color, user_id, avatar_bytes, avatar_key)
+        if image is None:
+            self.declined += 1
+            return None
+        output = io.BytesIO()
+        image.save(output, "WEBP", quality=90, method=0)  # method=0: fastest encoder setting
+        self.renders += 1
+        self.render_time += time.perf_counter() - started
+        return output.getvalue()
+
+    def _render(self, name, text, bubble_color, user_id, avatar_bytes, avatar_key):
+        avatar_size, gap, padding = AVATAR_SIZE, 10, 16
+        max_text_width = STICKER_SIZE - avatar_size - gap - 2 * padding
+        lines = self._wrap(text, max_text_width)
+        name_width = self._measure("name", name)
+        if lines is None or name_width is None:
+            return None  # Some character has no glyph: let QuotLyBot draw it
+        name_width = min(name_width, max_text_width)
+
+        luminance = 0.299 * bubble_color[0] + 0.587 * bubble_color[1] + 0.114 * bubble_color[2]
+        text_color = (0, 0, 0) if luminance > 160 else (255, 255, 255)
+        name_color = NAME_COLORS[abs(user_id) % len(NAME_COLORS)]
+
+        text_width = max([name_width] + [self._measure("text", line) for line in lines])
+        bubble_width = text_width + 2 * padding
+        bubble_height = self.line_height * (len(lines) + 1) + 2 * padding
+        width = avatar_size + gap + bubble_width
+        height = max(avatar_size, bubble_height)
+
+        canvas = Image.new("RGBA", (width, height))
+        canvas.alpha_composite(self._avatar(avatar_key, avatar_bytes, name, name_color, avatar_size), (0, 0))
+        bubble_x = avatar_size + gap
+        ImageDraw.Draw(canvas).rounded_rectangle(
+            (bubble_x, 0, bubble_x + bubble_width - 1, bubble_height - 1), radius=22, fill=bubble_color + (255,)
+        )
+
+        x, y = bubble_x + padding, padding
+        self._draw_text(canvas, "name", self._fit(name, max_text_width), x, y, name_color)
+        for line in lines:
+            y += self.line_height
+            self._draw_text(canvas, "text", line, x, y, text_color)
+
+        # Stickers: the longer side must be exactly 512px
+        scale = STICKER_SIZE / max(width, height)
+        if scale != 1:
+            canvas = canvas.resize((max(1, round(width * scale)), max(1, round(height * scale))), Image.BILINEAR)
+        return canvas
+
+    def _fit(self, name: str, max_width: int) -> str:
+        """Shorten a display name with an ellipsis to fit the bubble."""
+        if self._measure("name", name) <= max_width:
+            return name
+        while name and self._measure("name", name + "…") > max_width:
+            name = name[:-1]
+        return name + "…"
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "renders": self.renders,
+            "declined": self.declined,
+            "avg_render_ms": round(1000 * self.render_time / self.renders, 2) if self.renders else None,
+            "cached_glyphs": len(self.glyphs),
+            "cached_avatars": len(self.avatars),
+        }
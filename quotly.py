@@ -0,0 +1,293 @@
+"""
+@QuotLyBot integration helpers.
+Routes incoming QuotLyBot messages to the quote requests waiting for them.
+"""
+
+import asyncio
+import hashlib
+import time
+import unicodedata
+from collections import deque
+from typing import Optional, Dict
+from pyrogram import Client, filters
+from pyrogram.errors import FloodWait
+from pyrogram.handlers import MessageHandler
+from pyrogram.types import Message
+from ttl_cache import TTLCache
+from metrics import metrics
+
+QUOTLY_BOT = "QuotLyBot"
+
+
+class QuotlyResponseRouter:
+    """
+    Event-driven replacement for polling QuotLyBot's chat history.
+    Every quote request registers a future keyed by the id of the message sent to
+    QuotLyBot; the on_message handler resolves it the moment the reply arrives.
+    """
+
+    def __init__(self, unclaimed_limit: int = 20, orphan_ttl: float = 300, discard=None):
+        self.pending: Dict[int, asyncio.Future] = {}  # request message id -> future
+        self.pending_colors: Dict[int, asyncio.Future] = {}  # /qcolor message id -> future
+        # Requests that timed out but may still be answered late: request id -> time it timed out.
+        # Their late replies are consumed here instead of shifting the FIFO onto later requests.
+        self.orphaned: Dict[int, float] = {}
+        self.orphaned_colors: Dict[int, float] = {}
+        self.orphan_ttl = orphan_ttl  # After this many seconds a reply is written off
+        self.discard = discard  # Called with late replies (e.g. to queue them for cleanup)
+        # Responses that arrived before their request was registered (or for nobody)
+        self.unclaimed = deque(maxlen=unclaimed_limit)
+
+    def handler(self, group: int = -1) -> tuple:
+        """(handler, group) for the QuotLyBot messages (own group so it never shadows commands)."""
+        async def quotly_response_handler(_, message: Message):
+            self.dispatch(message)
+
+        return MessageHandler(quotly_response_handler, filters.chat(QUOTLY_BOT) & filters.incoming), group
+
+    @staticmethod
+    def is_quote_response(message: Message) -> bool:
+        """Heuristic to tell an actual quote apart from command confirmations."""
+        if message.photo or message.sticker:
+            return True  # Photos and stickers are almost certainly quotes
+        if message.text:
+            # QuotLyBot's color confirmation starts with "Color set to"
+            return not message.text.lower().startswith("color set to")
+        return False
+
+    @staticmethod
+    def is_color_confirmation(message: Message) -> bool:
+        """QuotLyBot confirms /qcolor with a text starting with "Color set to"."""
+        return bool(message.text) and message.text.lower().startswith("color set to")
+
+    @staticmethod
+    def answers(message: Message, request_id: int) -> bool:
+        """Whether `message` can be the reply to the request with id `request_id`."""
+        if message.reply_to_message_id:
+            return message.reply_to_message_id == request_id
+        return message.id > request_id
+
+    def dispatch(self, message: Message):
+        """Hand an incoming QuotLyBot message to the request that caused it."""
+        if self.is_quote_response(message):
+            pending, orphaned = self.pending, self.orphaned
+        elif self.is_color_confirmation(message):
+            pending, orphaned = self.pending_colors, self.orphaned_colors
+        else:
+            return
+        self._expire_orphans(orphaned)
+
+        if message.reply_to_message_id:
+            # QuotLyBot replied to a specific request: only that request may take it
+            if orphaned.pop(message.reply_to_message_id, None) is not None:
+                self._discard(message)
+                return
+            future = pending.pop(message.reply_to_message_id, None)
+            if future and not future.done():
+                future.set_result(message)
+            else:
+                self.unclaimed.append(message)  # Its request may not be registered yet
+            return
+
+        # No reply-to: fall back to strict FIFO over the requests sent before this message,
+        # counting timed-out requests whose reply is still owed
+        waiting = [request_id for request_id, future in pending.items()
+                   if request_id < message.id and not future.done()]
+        owed = [request_id for request_id in orphaned if request_id < message.id]
+        if owed and (not waiting or min(owed) < min(waiting)):
+            del orphaned[min(owed)]
+            self._discard(message)
+            return
+        if not waiting:
+            self.unclaimed.append(message)
+            return
+
+        future = pending.pop(min(waiting))
+        future.set_result(message)
+
+    def _expire_orphans(self, orphaned: Dict[int, float]):
+        """Write off timed-out requests QuotLyBot never answered, so they stop absorbing replies."""
+        cutoff = time.monotonic() - self.orphan_ttl
+        for request_id, timed_out_at in list(orphaned.items()):
+            if timed_out_at < cutoff:
+                del orphaned[request_id]
+
+    def _discard(self, message: Message):
+        print(f"⚠️ Late QuotLyBot reply {message.id} dropped: its request had already timed out")
+        metrics.inc("quotly_late_replies_total")
+        if self.discard:
+            self.discard(message)
+
+    def expect(self, request_id: int, color: bool = False) -> asyncio.Future:
+        """
+        Register interest in the reply to `request_id` and return the future it resolves.
+        With `color=True` the reply is the "Color set to" confirmation of a /qcolor command.
+        """
+        future = asyncio.get_running_loop().create_future()
+        is_reply_kind = self.is_color_confirmation if color else self.is_quote_response
+
+        # The reply may already be here if it raced the send_message round-trip
+        for message in list(self.unclaimed):
+            if is_reply_kind(message) and self.answers(message, request_id):
+                self.unclaimed.remove(message)
+                future.set_result(message)
+                return future
+
+        (self.pending_colors if color else self.pending)[request_id] = future
+        return future
+
+    async def wait_for_response(self, request_id: int, timeout: float = 15,
+                                future: Optional[asyncio.Future] = None,
+                                color: bool = False) -> Optional[Message]:
+        """Wait until QuotLyBot answers the request with id `request_id`, or return None on timeout."""
+        if future is None:
+            future = self.expect(request_id, color)
+        started = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(future, timeout)
+            metrics.observe("quotly_response_seconds", time.perf_counter() - started)
+            return response
+        except asyncio.TimeoutError:
+            metrics.inc("quotly_timeouts_total")
+            # The reply may still come; remember that it's owed so it can't go to a later request
+            (self.orphaned_colors if color else self.orphaned)[request_id] = time.monotonic()
+            return None
+        finally:
+            (self.pending_colors if color else self.pending).pop(request_id, None)
+
+
+class QuotePipeline:
+    """
+    Bounded, correctly-correlated quote pipeline.
+    At most `max_in_flight` requests are outstanding at QuotLyBot at once. Requests are sent
+    one at a time so each reply can be matched to its request (by reply-to id or FIFO), and
+    quotes are delivered back to every chat in the order the original messages were sent.
+    """
+
+    def __init__(self, router: QuotlyResponseRouter, max_in_flight: int = 3):
+        self.router = router
+        self.slots = asyncio.Semaphore(max(1, max_in_flight))
+        self.send_lock = asyncio.Lock()  # Keeps a color change and its text back-to-back
+        self.chat_queues: Dict[int, Dict[int, asyncio.Event]] = {}  # chat id -> message id -> delivered
+
+    def enter(self, chat_id: int, message_id: int):
+        """Reserve a delivery slot for a message; call before the first await of its handler."""
+        self.chat_queues.setdefault(chat_id, {})[message_id] = asyncio.Event()
+
+    async def wait_turn(self, chat_id: int, message_id: int):
+        """Wait until every earlier message of the chat has been delivered (or given up on)."""
+        queue = self.chat_queues.get(chat_id, {})
+        for earlier_id, delivered in list(queue.items()):
+            if earlier_id < message_id:
+                await delivered.wait()
+
+    def leave(self, chat_id: int, message_id: int):
+        """Release the delivery slot so later messages of the chat can go out."""
+        queue = self.chat_queues.get(chat_id)
+        if not queue:
+            return
+        delivered = queue.pop(message_id, None)
+        if delivered:
+            delivered.set()
+        if not queue:
+            del self.chat_queues[chat_id]
+
+    async def request(self, client: Client, text: str, timeout: float = 15, prepare=None):
+        """
+        Send `text` to QuotLyBot and wait for its quote.
+        `prepare` is an optional coroutine function run under the send lock right before the
+        text goes out (e.g. a /qcolor change). Returns (quote_request, response or None).
+        """
+        async with self.slots:
+            async with self.send_lock:
+                if prepare:
+                    await prepare()
+                quote_request = await client.send_message(f"@{QUOTLY_BOT}", text)
+                future = self.router.expect(quote_request.id)
+            response = await self.router.wait_for_response(quote_request.id, timeout, future)
+            return quote_request, response
+
+
+class QuotlyCleanupWorker:
+    """
+    Deletes QuotLyBot chat messages in the background.
+    Handlers only queue message ids; a worker removes them in bulk delete_messages calls every
+    `flush_interval` seconds, so cleanup never adds to a quote's latency.
+    """
+
+    BATCH_SIZE = 100  # delete_messages limit per call
+
+    def __init__(self, flush_interval: float = 2.0):
+        self.flush_interval = flush_interval
+        self.message_ids = []
+        self.client = None
+        self.task = None
+
+    def add(self, *messages: Optional[Message]):
+        """Queue QuotLyBot chat messages for deletion (None entries are ignored)."""
+        self.message_ids.extend(message.id for message in messages if message)
+
+    def start(self, client: Client):
+        """Start the flush loop; call from the running event loop once the client is started."""
+        self.client = client
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        """Delete everything queued so far, retrying after FLOOD_WAIT."""
+        while self.message_ids and self.client:
+            batch = self.message_ids[:self.BATCH_SIZE]
+            try:
+                await self.client.delete_messages(f"@{QUOTLY_BOT}", batch)
+            except FloodWait as e:
+                metrics.flood_wait(e.value, "quotly_cleanup")
+                print(f"⚠️ FLOOD_WAIT while cleaning QuotLyBot chat, retrying in {e.value}s")
+                await asyncio.sleep(e.value)
+                continue
+            except Exception as e:
+                print(f"Warning: Could not clean up QuotLyBot chat messages: {e}")
+            del self.message_ids[:len(batch)]
+
+
+class QuoteCache(TTLCache):
+    """
+    Content-addressed cache of rendered quotes.
+    Maps a normalized (text, color, reply-context) key to the photo/sticker file_id QuotLyBot
+    returned, so repeated quotes can be sent straight away without talking to the bot.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 7 * 24 * 3600, db_path: Optional[str] = None):
+        super().__init__(max_entries, ttl, db_path, table="quotes")
+
+    @staticmethod
+    def make_key(text: str, color: str, reply_context: Optional[str] = None) -> str:
+        normalized = unicodedata.normalize("NFC", text.strip())
+        return hashlib.sha256(f"{color}\x00{reply_context or ''}\x00{normalized}".encode()).hexdigest()
+
+    def lookup(self, text: str, color: str, reply_context: Optional[str] = None) -> Optional[dict]:
+        return self.get(self.make_key(text, color, reply_context))
+
+    def remember(self, text: str, color: str, response: Message, request: Message,
+                 reply_context: Optional[str] = None):
+        """
+        Cache QuotLyBot's response if it is a photo or sticker that replied to `request`.
+        A response matched by FIFO (no reply-to) may belong to another request when QuotLyBot
+        answers out of order; delivering it once is recoverable, caching it forever is not.
+        """
+        if response.reply_to_message_id != request.id:
+            return
+        if response.photo:
+            value = {"kind": "photo", "file_id": response.photo.file_id, "caption": response.caption}
+        elif response.sticker:
+            value = {"kind": "sticker", "file_id": response.sticker.file_id}
+        else:
+            return
+        self.set(self.make_key(text, color, reply_context), value)
+
+    def forget(self, text: str, color: str, reply_context: Optional[str] = None):
+        self.delete(self.make_key(text, color, reply_context))
@@ -0,0 +1,107 @@
+"""
+Runtime state persistence.
+State lives in memory; writes are debounced and done off the event loop, atomically
+(temp file + fsync + rename), so a crash can never leave a truncated state file behind.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+from typing import Any, Optional
+
+
+class JsonFileBackend:
+    """Whole state as one JSON document."""
+
+    def __init__(self, path: str = 'state.json'):
+        self.path = path
+
+    def load(self) -> Optional[dict]:
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def save(self, state: dict):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+class SqliteBackend:
+    """One row per top-level key, for when the state outgrows a single JSON file."""
+
+    def __init__(self, path: str):
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT)")
+        self.db.commit()
+
+    def load(self) -> Optional[dict]:
+        rows = self.db.execute("SELECT key, value FROM state").fetchall()
+        return {key: json.loads(value) for key, value in rows} if rows else None
+
+    def save(self, state: dict):
+        with self.db:
+            self.db.execute("DELETE FROM state")
+            self.db.executemany(
+                "INSERT INTO state (key, value) VALUES (?, ?)",
+                [(key, json.dumps(value)) for key, value in state.items()]
+            )
+
+
+class StateStore:
+    def __init__(self, backend=None, delay: float = 0.5):
+        self.backend = backend or JsonFileBackend()
+        self.delay = delay  # Changes within this many seconds are written together
+        self.data = {}
+        self.loaded = False
+        self.save_handle = None
+        self.write_lock = None
+        self.writes = 0
+
+    def load(self) -> dict:
+        """Read the persisted state (startup only, before the event loop is busy)."""
+        state = self.backend.load()
+        self.loaded = state is not None
+        self.data = state or {}
+        return self.data
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.data.get(key, default)
+
+    def update(self, **values):
+        """Change state in memory and schedule a debounced write."""
+        self.data.update(values)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write(self._snapshot())  # No event loop yet (startup): write directly
+            return
+        if self.save_handle is None:
+            self.save_handle = loop.call_later(self.delay, lambda: asyncio.ensure_future(self.flush()))
+
+    def _snapshot(self) -> dict:
+        # Deep copy through JSON so the writer thread never sees later mutations
+        return json.loads(json.dumps(self.data))
+
+    def _write(self, snapshot: dict):
+        self.backend.save(snapshot)
+        self.writes += 1
+
+    async def flush(self):
+        """Write the current state now (off the event loop). Safe to call at shutdown."""
+        if self.save_handle:
+            self.save_handle.cancel()
+            self.save_handle = None
+        if self.write_lock is None:
+            self.write_lock = asyncio.Lock()
+        async with self.write_lock:  # One writer at a time; the latest snapshot wins
+            try:
+                await asyncio.to_thread(self._write, self._snapshot())
+            except Exception as e:
+                print(f"⚠️ Failed to save state: {e}")
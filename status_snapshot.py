@@ -0,0 +1,70 @@
+"""
+Immutable status snapshots for the web endpoints.
+The bot's event loop builds the status and publishes it as pre-serialized JSON; the web
+thread only reads the current snapshot reference, so it never touches live bot objects
+(or Pyrogram) from the wrong thread and every request is constant-time.
+"""
+
+import asyncio
+import json
+import time
+from typing import Callable, NamedTuple
+
+
+class StatusSnapshot(NamedTuple):
+    connected: bool
+    health_json: str  # Body for `/`
+    status_json: str  # Body for `/status`
+    published_at: float
+
+
+class StatusPublisher:
+    def __init__(self, refresh_interval: float = 1.0):
+        self.refresh_interval = refresh_interval  # Counters (queues, caches) are re-published this often
+        self.current = STARTING_SNAPSHOT
+        self.collect = None
+        self.task = None
+
+    @staticmethod
+    def build(status: dict) -> StatusSnapshot:
+        now = time.time()
+        status = dict(status, updated_at=now)
+        health = {
+            "status": "running",
+            "service": "telegram_userbot",
+            "auto_quote_enabled": status.get("auto_quote_mode", False),
+            "connection": status.get("connection"),
+        }
+        return StatusSnapshot(
+            connected=bool(status.get("userbot_running")),
+            health_json=json.dumps(health),
+            status_json=json.dumps(status, default=str),
+            published_at=now
+        )
+
+    def publish(self, status: dict):
+        """Replace the current snapshot; a single reference assignment, so readers never see a partial one."""
+        self.current = self.build(status)
+
+    def refresh(self):
+        """Publish now (after a change); no-op until start() has provided the collector."""
+        if self.collect:
+            self.publish(self.collect())
+
+    def start(self, collect: Callable[[], dict]):
+        """Re-publish `collect()` periodically; call from the running event loop."""
+        self.collect = collect
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                self.publish(self.collect())
+            except Exception as e:
+                print(f"Warning: Could not publish status snapshot: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+
+# Served until the bot publishes its first snapshot
+STARTING_SNAPSHOT = StatusPublisher.build({"userbot_running": False, "connection": "starting", "auto_quote_mode": False})
@@ -0,0 +1,51 @@
+"""QuoteCache: only responses QuotLyBot sent as a reply to the request are cached."""
+
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("pyrogram")
+
+from quotly import QuoteCache
+
+
+def sticker_response(message_id: int, reply_to=None):
+    return SimpleNamespace(id=message_id, reply_to_message_id=reply_to, photo=None, text=None,
+                           sticker=SimpleNamespace(file_id=f"sticker-{message_id}"))
+
+
+def test_direct_reply_is_cached():
+    cache = QuoteCache()
+    request = SimpleNamespace(id=10)
+    cache.remember("hello", "red", sticker_response(11, reply_to=10), request)
+    assert cache.lookup("hello", "red") == {"kind": "sticker", "file_id": "sticker-11"}
+
+
+def test_fifo_matched_response_is_not_cached():
+    cache = QuoteCache()
+    request = SimpleNamespace(id=10)
+    # No reply-to: matched by arrival order only, it could be the quote of another request
+    cache.remember("hello", "red", sticker_response(12), request)
+    # Reply to a different request
+    cache.remember("hello", "red", sticker_response(13, reply_to=9), request)
+    assert cache.lookup("hello", "red") is None
+
+
+def test_persistent_writes_are_batched_off_the_loop(tmp_path):
+    import asyncio
+    from ttl_cache import TTLCache
+    path = str(tmp_path / "cache.db")
+
+    async def run():
+        cache = TTLCache(max_entries=1, db_path=path, flush_delay=0.05)
+        cache.set("a", 1)
+        cache.set("b", 2)  # Evicts "a" from memory before it's committed
+        assert cache.get("a") == 1
+        cache.delete("b")
+        await asyncio.sleep(0.2)  # Debounced flush
+        return cache.pending
+
+    assert asyncio.run(run()) == {}
+    reopened = TTLCache(db_path=path)
+    assert reopened.get("a") == 1
+    assert reopened.get("b") is None
@@ -0,0 +1,131 @@
+"""
+Quote handlers under a burst: more quotable messages than Pyrogram has dispatcher workers.
+The dispatcher is emulated (a fixed pool of workers draining one update queue, like
+Pyrogram's), and a fake QuotLyBot answers through that same queue.
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("pyrogram")
+
+WORKERS = 4
+QUOTLY_CHAT = SimpleNamespace(id=-1, username="QuotLyBot")
+
+
+class FakeTelegram:
+    """Just enough of a Pyrogram client for auto-quotes; QuotLyBot replies become updates."""
+
+    def __init__(self, updates: asyncio.Queue, reply_delay: float = 0.02):
+        self.updates = updates
+        self.reply_delay = reply_delay
+        self.last_id = 1000
+        self.delivered = []  # (chat id, kind, payload) sent to user chats
+
+    def new_id(self) -> int:
+        self.last_id += 1
+        return self.last_id
+
+    async def send_message(self, chat_id, text, **kwargs):
+        message = SimpleNamespace(id=self.new_id(), text=text)
+        if chat_id == "@QuotLyBot":
+            asyncio.get_running_loop().call_later(self.reply_delay, self.quotly_reply, message)
+        else:
+            self.delivered.append((chat_id, "text", text))
+        return message
+
+    def quotly_reply(self, request):
+        if request.text.startswith("/qcolor"):
+            reply = SimpleNamespace(text="Color set to custom", photo=None, sticker=None, caption=None)
+        else:
+            reply = SimpleNamespace(text=None, photo=None, caption=None,
+                                    sticker=SimpleNamespace(file_id=f"st:{request.text}"))
+        reply.id = self.new_id()
+        reply.reply_to_message_id = request.id
+        reply.chat = QUOTLY_CHAT
+        self.updates.put_nowait(reply)
+
+    async def send_sticker(self, chat_id=None, sticker=None, **kwargs):
+        self.delivered.append((chat_id, "sticker", getattr(sticker, "file_id", sticker)))
+
+    async def delete_messages(self, *args, **kwargs):
+        pass
+
+
+def user_message(message_id: int, chat_id: int, text: str, delete_delay: float = 0):
+    async def delete():
+        await asyncio.sleep(delete_delay)
+    return SimpleNamespace(id=message_id, chat=SimpleNamespace(id=chat_id, title=None, first_name="chat"),
+                           text=text, from_user=None, reply_to_message=None, delete=delete)
+
+
+@pytest.fixture
+def userbot(tmp_path, monkeypatch):
+    monkeypatch.setenv("SESSION_STRING", "test")
+    monkeypatch.setenv("STATE_DB", str(tmp_path / "state.db"))
+    monkeypatch.setenv("QUOTE_JOURNAL_FILE", str(tmp_path / "journal.log"))
+    monkeypatch.setenv("QUOTE_CACHE_DB", "")
+    monkeypatch.setenv("LOCAL_QUOTE_RENDERER", "0")
+    from userbot import TelegramUserbot
+    bot = TelegramUserbot()
+    bot.auto_quote_enabled = True
+    return bot
+
+
+def dispatch(userbot, messages: list, expected: int) -> list:
+    """Feed `messages` through an emulated dispatcher; returns what was delivered to user chats."""
+    async def run():
+        updates = asyncio.Queue()
+        client = FakeTelegram(updates)
+        handlers = userbot.build_handlers()
+        router_callback = handlers[0][0].callback
+        quote_command_callback = handlers[1][0].callback
+        auto_quote_callback = handlers[2][0].callback
+
+        async def worker():
+            while True:
+                message = await updates.get()
+                if message.chat is QUOTLY_CHAT:
+                    callback = router_callback
+                elif message.text.startswith(".q "):
+                    callback = quote_command_callback
+                else:
+                    callback = auto_quote_callback
+                await callback(client, message)
+
+        workers = [asyncio.create_task(worker()) for _ in range(WORKERS)]
+        for message in messages:
+            updates.put_nowait(message)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + 10
+        while len(client.delivered) < expected and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+        for task in workers:
+            task.cancel()
+        return client.delivered
+
+    return asyncio.run(run())
+
+
+def test_burst_larger_than_worker_pool_is_quoted(userbot):
+    messages = [user_message(i, chat_id=i % 3, text=f"m{i}") for i in range(1, 3 * WORKERS + 1)]
+    delivered = dispatch(userbot, messages, len(messages))
+
+    # Every message came back as its own quote, in order within each chat, and none was restored
+    assert all(kind == "sticker" for _, kind, _ in delivered), delivered
+    for chat_id in range(3):
+        expected = [f"st:{m.text}" for m in messages if m.chat.id == chat_id]
+        assert [payload for chat, _, payload in delivered if chat == chat_id] == expected
+
+
+def test_color_quote_keeps_its_place_before_later_auto_quotes(userbot):
+    # The .q command is slow to get going (its delete is slow); the auto-quote after it must wait
+    messages = [
+        user_message(1, chat_id=7, text=".q red first", delete_delay=0.3),
+        user_message(2, chat_id=7, text="second"),
+    ]
+    delivered = dispatch(userbot, messages, 2)
+    assert [payload for _, _, payload in delivered] == ["st:first", "st:second"]
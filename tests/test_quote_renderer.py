@@ -0,0 +1,31 @@
+"""Local quote renderer: what it draws itself and what it leaves to QuotLyBot."""
+
+import pytest
+
+pytest.importorskip("PIL")
+
+from quote_renderer import QuoteRenderer
+
+
+@pytest.fixture(scope="module")
+def renderer():
+    renderer = QuoteRenderer()
+    if renderer.fonts["text"].getname()[0] != "DejaVu Sans":
+        pytest.skip("DejaVu Sans is not installed")
+    return renderer
+
+
+def test_plain_text_is_rendered_as_sticker(renderer):
+    sticker = renderer.render("Envo", "hello world", "blue", user_id=1)
+    assert sticker[:4] == b"RIFF" and sticker[8:12] == b"WEBP"
+
+
+@pytest.mark.parametrize("text", ["hi 😀", "ok 👍🏽", "☀ sunny", "1️⃣ first"])
+def test_emoji_without_emoji_font_go_to_quotlybot(renderer, text):
+    # DejaVu has monochrome outlines for some of these; they must not be drawn flat
+    assert renderer.emoji_font is None
+    assert renderer.render("Envo", text, "blue", user_id=1) is None
+
+
+def test_unknown_color_goes_to_quotlybot(renderer):
+    assert renderer.render("Envo", "hello", "mauve-ish") is None
@@ -0,0 +1,146 @@
+"""
+Small LRU + TTL cache with optional SQLite persistence.
+Values must be JSON-serializable so they can survive restarts when a database path is given.
+Writes are batched and committed off the event loop (WAL mode, so lookups never wait for them).
+"""
+
+import asyncio
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Optional, Any
+
+
+class TTLCache:
+    def __init__(self, max_entries: int = 512, ttl: float = 7 * 24 * 3600,
+                 db_path: Optional[str] = None, table: str = "cache", flush_delay: float = 1.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expires_at, value), most recently used last
+        self.hits = 0
+        self.misses = 0
+        self.table = table
+        self.flush_delay = flush_delay  # Changes within this many seconds are committed together
+        self.pending = {}  # key -> (expires_at, value) to store, or None to delete
+        self.flush_handle = None
+        self.write_lock = None
+        self.db = None  # Lookups (event loop)
+        self.writer = None  # Batched writes (worker thread)
+        if db_path:
+            try:
+                self.db = self._connect(db_path)
+                self.db.execute(
+                    f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, expires_at REAL, value TEXT)"
+                )
+                self.db.execute(f"DELETE FROM {table} WHERE expires_at < ?", (time.time(),))
+                self.db.commit()
+                self.writer = self._connect(db_path)
+            except sqlite3.Error as e:
+                print(f"⚠️ Cache database {db_path} unavailable, using memory only: {e}")
+                self.db = None
+
+    @staticmethod
+    def _connect(db_path: str) -> sqlite3.Connection:
+        db = sqlite3.connect(db_path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")  # Readers don't wait for the writer
+        db.execute("PRAGMA synchronous=NORMAL")  # No fsync per commit; a crash loses at most the last batch
+        return db
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for `key`, or None if missing or expired."""
+        now = time.time()
+        entry = self.entries.get(key)
+        if entry is None and self.db:
+            if key in self.pending:
+                entry = self.pending[key]  # Evicted from memory, not committed yet
+            else:
+                row = self.db.execute(
+                    f"SELECT expires_at, value FROM {self.table} WHERE key = ?", (key,)
+                ).fetchone()
+                entry = (row[0], json.loads(row[1])) if row else None
+            if entry is not None:
+                self.entries[key] = entry
+                self._evict()
+
+        if entry is None or entry[0] < now:
+            if entry is not None:
+                self.delete(key)
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: str, value: Any):
+        """Store `value` under `key` for `ttl` seconds."""
+        expires_at = time.time() + self.ttl
+        self.entries[key] = (expires_at, value)
+        self.entries.move_to_end(key)
+        self._evict()
+        self._persist(key, (expires_at, value))
+
+    def delete(self, key: str):
+        """Drop `key` from memory and disk (e.g. when a cached file_id stopped working)."""
+        self.entries.pop(key, None)
+        self._persist(key, None)
+
+    def _persist(self, key: str, entry: Optional[tuple]):
+        """Queue a write for the next batch; without a running event loop, write it right away."""
+        if not self.db:
+            return
+        self.pending[key] = entry
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write(self._take_pending())
+            return
+        if self.flush_handle is None:
+            self.flush_handle = loop.call_later(self.flush_delay, lambda: asyncio.ensure_future(self.flush()))
+
+    def _take_pending(self) -> dict:
+        batch, self.pending = self.pending, {}
+        return batch
+
+    def _write(self, batch: dict):
+        try:
+            with self.writer:  # One transaction per batch
+                self.writer.executemany(
+                    f"INSERT OR REPLACE INTO {self.table} (key, expires_at, value) VALUES (?, ?, ?)",
+                    [(key, entry[0], json.dumps(entry[1])) for key, entry in batch.items() if entry is not None]
+                )
+                self.writer.executemany(
+                    f"DELETE FROM {self.table} WHERE key = ?",
+                    [(key,) for key, entry in batch.items() if entry is None]
+                )
+        except sqlite3.Error as e:
+            print(f"Warning: Could not persist {len(batch)} cache entries: {e}")
+
+    async def flush(self):
+        """Commit queued writes now (off the event loop). Safe to call at shutdown."""
+        if self.flush_handle:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        if not self.pending:
+            return
+        if self.write_lock is None:
+            self.write_lock = asyncio.Lock()
+        async with self.write_lock:  # Batches are committed in order
+            await asyncio.to_thread(self._write, self._take_pending())
+
+    def _evict(self):
+        # Only the in-memory LRU is bounded; on-disk rows expire by TTL
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "persistent": self.db is not None,
+            "unsaved": len(self.pending),
+        }
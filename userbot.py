@@ -4,70 +4,214 @@ Handles auto-quote functionality with @QuotLyBot integration.
 """
 
 import asyncio
-import json
+import io
 import os
 import re
+import random
+import sys
+import threading
+import time
 from typing import Optional, Dict, Any
 from pyrogram import Client, filters
+from pyrogram.errors import FloodWait, Unauthorized
+from pyrogram.handlers import MessageHandler
 from pyrogram.types import Message
 from config import Config
-import google.generativeai as genai
 
 # Import the new ask_ai_command from the separate file
 from ask_command import ask_ai_command , analyse_word_command
+from edit_scheduler import EditScheduler
+from gemini_gateway import GeminiGateway
+from state_store import StateStore, JsonFileBackend, SqliteBackend
+from quote_journal import QuoteJournal
+from error_reporter import ErrorReporter
+from metrics import metrics, StartupTimer
+from status_snapshot import StatusPublisher
+from quote_renderer import QuoteRenderer
+import ask_command
+from quotly import QuotlyResponseRouter, QuotePipeline, QuoteCache, QuotlyCleanupWorker
+
+# Errors after which reconnecting is pointless (the session was revoked or the account is gone)
+FATAL_ERRORS = ("AUTH_KEY_UNREGISTERED", "AUTH_KEY_INVALID", "SESSION_REVOKED", "SESSION_EXPIRED", "USER_DEACTIVATED")
+RECONNECT_BASE_DELAY = 1  # Seconds; doubled per failed attempt (with jitter) up to RECONNECT_MAX_DELAY
+SESSION_IN_USE_BASE_DELAY = 15  # AUTH_KEY_DUPLICATED clears only once the other client lets go
 
 class TelegramUserbot:
     def __init__(self):
+        self.startup = StartupTimer()
         self.config = Config()
         self.client = None
         self.auto_quote_enabled = False
         self.current_color = "default"
         self.quotly_bot_color = None  # Track what color QuotLyBot is currently set to
         self.pending_color_change = None
-        self.original_messages = {}  # Store original messages for error recovery
+        self.is_connected = False
+        self.has_connected = False  # Startup tasks (journal replay, startup message, warm-up) run once
+        self.handlers = []
+        self.handler_tasks = set()  # Work started by handlers (see spawn)
+        self.connection_state = "starting"
+        self.last_success = {}  # What -> unix time it last worked (connect, quote)
+        self.status_publisher = StatusPublisher(self.config.STATUS_REFRESH_INTERVAL)  # Read by the web endpoints
+        self.quote_journal = QuoteJournal(self.config.QUOTE_JOURNAL_FILE)  # Originals of in-flight auto-quotes
+        self.error_reporter = ErrorReporter(self.config.ERROR_DIGEST_INTERVAL)  # Batches error reports into digests
+        self.state_store = StateStore(
+            SqliteBackend(self.config.STATE_DB) if self.config.STATE_DB else JsonFileBackend('state.json')
+        )
+        self.quotly_cleanup = QuotlyCleanupWorker()  # Bulk-deletes QuotLyBot chat messages off the critical path
+        # Resolves QuotLyBot replies as they arrive; late replies to timed-out requests are cleaned up
+        self.quotly_router = QuotlyResponseRouter(discard=self.quotly_cleanup.add)
+        self.quote_pipeline = QuotePipeline(self.quotly_router, self.config.QUOTE_MAX_IN_FLIGHT)
+        self.edit_scheduler = EditScheduler(self.config.EDIT_MIN_INTERVAL)  # Paces animation/streaming edits
+        self.quote_cache = QuoteCache(
+            self.config.QUOTE_CACHE_SIZE,
+            self.config.QUOTE_CACHE_TTL,
+            self.config.QUOTE_CACHE_DB or None
+        )
+        self.quote_renderer = None  # Local Pillow renderer, tried before QuotLyBot
+        if self.config.LOCAL_QUOTE_RENDERER:
+            self.quote_renderer = QuoteRenderer(
+                self.config.QUOTE_FONT,
+                self.config.QUOTE_BOLD_FONT,
+                self.config.QUOTE_EMOJI_FONT or None
+            )
+            if not self.quote_renderer.enabled:
+                print("⚠️ LOCAL_QUOTE_RENDERER is set but the renderer is unavailable (Pillow or fonts missing); using QuotLyBot only.")
+                self.quote_renderer = None
         self.load_state()
+        self.unfinished_quotes = self.quote_journal.open()  # Replayed once the client is connected
         
-        # Initialize Gemini AI model (Existing)
-        if self.config.GEMINI_API_KEY:
-            genai.configure(api_key=self.config.GEMINI_API_KEY)
-            # CHANGED MODEL NAME from 'gemini-1.5-pro' to 'gemini-1.5-flash'
-            self.gemini_model = genai.GenerativeModel('gemini-1.5-flash') 
-            print("✅ Gemini AI model initialized successfully with gemini-1.5-flash.")
-        else:
-            self.gemini_model = None
+        # Gemini AI model: google.generativeai is imported and the model built on first use
+        # (or by the warm-up after connecting), not before the client is up
+        self._gemini_model = None
+        self._gemini_gateway = None
+        self.gemini_lock = threading.Lock()
+        if not self.config.GEMINI_API_KEY:
             print("⚠️ GEMINI_API_KEY not found. Gemini AI features disabled.")
-        
-    def load_state(self):
-        """Load userbot state from JSON file."""
+        self.startup.mark("init")
+    
+    def load_gemini(self):
+        """Import google.generativeai and build the model + gateway once. Returns the model (None if disabled)."""
+        if self._gemini_model is not None or not self.config.GEMINI_API_KEY:
+            return self._gemini_model
+        with self.gemini_lock:
+            if self._gemini_model is None:
+                import google.generativeai as genai
+                genai.configure(api_key=self.config.GEMINI_API_KEY)
+                # CHANGED MODEL NAME from 'gemini-1.5-pro' to 'gemini-1.5-flash'
+                model = genai.GenerativeModel('gemini-1.5-flash')
+                # All model calls go through the gateway: own thread pool, RPM limiter, deadlines
+                self._gemini_gateway = GeminiGateway(
+                    model,
+                    max_workers=self.config.GEMINI_MAX_WORKERS,
+                    requests_per_minute=self.config.GEMINI_RPM,
+                    default_timeout=self.config.GEMINI_TIMEOUT
+                )
+                self._gemini_model = model
+                print("✅ Gemini AI model initialized successfully with gemini-1.5-flash.")
+        return self._gemini_model
+    
+    async def ensure_gemini(self):
+        """load_gemini() without blocking the event loop on the first (import-heavy) call."""
+        if self._gemini_model is not None or not self.config.GEMINI_API_KEY:
+            return self._gemini_model
+        return await asyncio.to_thread(self.load_gemini)
+    
+    @property
+    def gemini_model(self):
+        return self.load_gemini()
+    
+    @property
+    def gemini_gateway(self):
+        self.load_gemini()
+        return self._gemini_gateway
+    
+    async def warm_up(self):
+        """Load Gemini and the Wordle solver in the background so the first .ask/.analyse is fast."""
+        timer = StartupTimer("Warm-up")
         try:
-            with open('state.json', 'r') as f:
-                state = json.load(f)
-                self.auto_quote_enabled = state.get('auto_quote_enabled', False)
-                self.current_color = state.get('current_color', 'default')
-        except (FileNotFoundError, json.JSONDecodeError):
+            await asyncio.to_thread(self.load_gemini)
+            timer.mark("gemini")
+            solver = await asyncio.to_thread(ask_command.get_wordle_solver)
+            timer.mark("solver")
+            await asyncio.to_thread(solver.warm_up)
+            timer.mark("solver_patterns")
+        except Exception as e:
+            print(f"⚠️ Warm-up stopped early: {e}")
+        timer.report()
+    
+    def load_state(self):
+        """Load userbot state from the state store (state.json by default)."""
+        state = self.state_store.load()
+        if not self.state_store.loaded:
             self.save_state()
+            return
+        self.auto_quote_enabled = state.get('auto_quote_enabled', False)
+        self.current_color = state.get('current_color', 'default')
+        self.quotly_bot_color = state.get('quotly_bot_color')
     
     def save_state(self):
-        """Save userbot state to JSON file."""
-        state = {
-            'auto_quote_enabled': self.auto_quote_enabled,
-            'current_color': self.current_color
+        """Save userbot state. Writes are debounced, atomic and done off the event loop."""
+        self.state_store.update(
+            auto_quote_enabled=self.auto_quote_enabled,
+            current_color=self.current_color,
+            quotly_bot_color=self.quotly_bot_color
+        )
+        self.status_publisher.refresh()
+    
+    def set_connection_state(self, state: str):
+        """Record a connection change and publish it to the web endpoints right away."""
+        self.connection_state = state
+        self.is_connected = state == "connected"
+        if self.is_connected:
+            self.last_success["connect"] = time.time()
+        self.status_publisher.refresh()
+    
+    def collect_status(self) -> dict:
+        """Build the status published to /status (runs on the event loop)."""
+        return {
+            "userbot_running": self.is_connected,
+            "connection": self.connection_state,
+            "auto_quote_mode": self.auto_quote_enabled,
+            "current_color": self.current_color,
+            "queues": {
+                "quotes_in_progress": sum(len(queue) for queue in self.quote_pipeline.chat_queues.values()),
+                "quotly_cleanup": len(self.quotly_cleanup.message_ids),
+                "journal": len(self.quote_journal.pending),
+            },
+            "last_success": dict(self.last_success),
+            "quote_cache": self.quote_cache.stats(),
+            "ask_cache": ask_command.response_cache.stats() if ask_command.response_cache else None,
+            "gemini": self._gemini_gateway.stats() if self._gemini_gateway else None,
+            "local_renderer": self.quote_renderer.stats() if self.quote_renderer else None,
+            "edits": self.edit_scheduler.stats(),
+            "errors": self.error_reporter.stats()
         }
-        with open('state.json', 'w') as f:
-            json.dump(state, f, indent=2)
+    
+    async def restore_pending_messages(self):
+        """Replay the quote journal: re-post messages whose auto-quote was cut short by a restart."""
+        pending, self.unfinished_quotes = self.unfinished_quotes, {}
+        for key, entry in pending.items():
+            try:
+                await self.client.send_message(
+                    entry["chat_id"],
+                    entry["text"],
+                    reply_to_message_id=entry.get("reply_to")
+                )
+                print(f"♻️ Restored message {key} left pending by a restart")
+            except Exception as e:
+                print(f"Failed to restore pending message {key}: {e}")
+            await asyncio.to_thread(self.quote_journal.finish, key)
     
     async def log_error(self, error_msg: str, original_message: Optional[Message] = None):
-        """Send error messages to Saved Messages."""
-        try:
-            me = await self.client.get_me()
-            error_text = f"🚨 **Userbot Error**\n\n{error_msg}"
-            
-            if original_message:
-                error_text += f"\n\n**Original Message:**\nChat: {original_message.chat.title or original_message.chat.first_name}\nText: {original_message.text}"
-            
-            await self.client.send_message("me", error_text)
-        except Exception as e:
-            print(f"Failed to log error: {e}")
+        """Queue an error for the next Saved Messages digest (grouped by exception type and caller)."""
+        exc = sys.exc_info()[1]
+        error_type = type(exc).__name__ if exc else "Error"
+        site = sys._getframe(1).f_code.co_name
+        error_text = error_msg
+        if original_message:
+            error_text += f"\nChat: {original_message.chat.title or original_message.chat.first_name} | Text: {original_message.text}"
+        print(f"⚠️ {error_type} in {site}: {error_msg}")
+        self.error_reporter.report(error_type, site, error_text)
     
     async def setup_client(self):
         """Initialize Pyrogram client with session string."""
@@ -81,8 +225,19 @@ class TelegramUserbot:
             print(f"Failed to setup client: {e}")
             return False
     
+    @staticmethod
+    def is_color_quote(text: str) -> bool:
+        """Whether a .q command quotes text (`.q color text`) rather than changing a setting."""
+        command_parts = text.strip()[2:].strip().split(' ', 1)
+        return len(command_parts) == 2 and command_parts[0].lower() not in ('start', 'stop')
+    
+    @staticmethod
+    def is_auto_quotable(message: Message) -> bool:
+        """Commands and bot messages are never auto-quoted."""
+        return not (message.text and message.text.startswith('.') or (message.from_user and message.from_user.is_bot))
+    
     async def handle_quote_command(self, client: Client, message: Message):
-        """Handle .q commands for quote functionality."""
+        """Handle .q commands for quote functionality (a `.q color text` quote was entered by the handler)."""
         try:
             # Delete the command message
             await message.delete()
@@ -127,37 +282,127 @@ class TelegramUserbot:
                 await client.send_message("me", f"🎨 **Color set to: {color_name}**\nFuture quotes will use this color.")
                 
                 # IMMEDIATELY send the color command to QuotLyBot when the user sets a default color
-                color_msg_to_quotly = await client.send_message("@QuotLyBot", f"/qcolor {color_name}")
-                self.quotly_bot_color = color_name # Update our internal tracking of QuotLyBot's color
-                await asyncio.sleep(1) # Give QuotLyBot a moment to process the command
-                try:
-                    await color_msg_to_quotly.delete() # Clean up this message from QuotLyBot chat
-                except Exception as e:
-                    print(f"Warning: Could not delete color command message to QuotLyBot: {e}")
+                # (forced, in case QuotLyBot's color was changed outside the userbot)
+                async with self.quote_pipeline.send_lock:
+                    color_msgs = await self.ensure_quotly_color(client, self.quotly_color(color_name), force=True)
+                self.quotly_cleanup.add(*color_msgs) # Clean up these messages from QuotLyBot chat
         
         except Exception as e:
             await self.log_error(f"Error in handle_quote_command: {str(e)}", message)
+        
+        finally:
+            # Release the delivery slot even if the quote never started (no-op for other commands)
+            self.quote_pipeline.leave(message.chat.id, message.id)
+    
+    def quotly_color(self, color_name: str) -> str:
+        """The /qcolor value for a color name: "default" is QuotLyBot's own default background."""
+        return self.config.QUOTLY_DEFAULT_COLOR if color_name.lower() == "default" else color_name
+    
+    async def ensure_quotly_color(self, client: Client, color_name: str, force: bool = False) -> list:
+        """
+        Make sure QuotLyBot is set to `color_name`.
+        Costs nothing when the tracked color already matches; otherwise sends /qcolor and waits
+        for QuotLyBot's "Color set to" confirmation. Returns the QuotLyBot messages to clean up.
+        Call with the quote pipeline's send lock held so no quote request slips in between.
+        """
+        if not force and self.quotly_bot_color == color_name:
+            return []
+        
+        color_msg = await client.send_message("@QuotLyBot", f"/qcolor {color_name}")
+        confirmation = await self.quotly_router.wait_for_response(color_msg.id, timeout=5, color=True)
+        if not confirmation:
+            self.quotly_cleanup.add(color_msg)
+            self.quotly_bot_color = None  # Unknown now; the next quote re-sends the color
+            self.save_state()
+            raise Exception(f"QuotLyBot didn't confirm the color change to {color_name}.")
+        
+        self.quotly_bot_color = color_name # Update our internal tracking of QuotLyBot's color
+        self.save_state()
+        return [color_msg, confirmation]
+    
+    async def send_cached_quote(self, client: Client, cached: dict, **send_params) -> bool:
+        """
+        Send a quote file remembered by the quote cache, without talking to QuotLyBot.
+        Returns False if Telegram rejected the stored file_id, so the caller can re-render.
+        """
+        try:
+            if cached["kind"] == "photo":
+                await client.send_photo(photo=cached["file_id"], caption=cached.get("caption"), **send_params)
+            else:
+                await client.send_sticker(sticker=cached["file_id"], **send_params)
+            return True
+        except Exception as e:
+            print(f"Warning: Cached quote could not be sent, asking QuotLyBot again: {e}")
+            return False
+    
+    async def render_local_quote(self, client: Client, user, text: str, color: str) -> Optional[io.BytesIO]:
+        """
+        Draw the quote locally as a sticker file. Returns None when the renderer is off or
+        declines the quote (unknown color, glyphs it can't draw), so the caller asks QuotLyBot.
+        """
+        if not self.quote_renderer:
+            return None
+        try:
+            avatar_key, avatar_bytes = None, None
+            if user and user.photo:
+                avatar_key = user.photo.small_photo_unique_id
+                # Downloaded only when the renderer hasn't cached this photo yet
+                if not self.quote_renderer.has_avatar(avatar_key):
+                    avatar = await client.download_media(user.photo.small_file_id, in_memory=True)
+                    avatar_bytes = bytes(avatar.getbuffer())
+            name = " ".join(filter(None, [user.first_name, user.last_name])) if user else ""
+            sticker = await asyncio.to_thread(
+                self.quote_renderer.render, name, text, color,
+                user.id if user else 0, avatar_bytes, avatar_key
+            )
+        except Exception as e:
+            print(f"Warning: Local quote render failed, asking QuotLyBot: {e}")
+            return None
+        if sticker is None:
+            return None
+        sticker_file = io.BytesIO(sticker)
+        sticker_file.name = "quote.webp"
+        return sticker_file
     
     async def quote_with_color(self, client: Client, original_message: Message, color_name: str, text: str):
-        """Send quote with specific color to @QuotLyBot."""
+        """Send quote with specific color to @QuotLyBot (the caller enters and leaves the quote pipeline)."""
+        chat_id = original_message.chat.id
         try:
             # Store original message for potential restoration
             msg_id = f"{original_message.chat.id}_{original_message.id}"
+            color_name = self.quotly_color(color_name)
+            color_msgs = []
             
-            # Send color command to QuotLyBot
-            color_msg = await client.send_message("@QuotLyBot", f"/qcolor {color_name}")
+            # Same text and color quoted before: reuse QuotLyBot's earlier render
+            cached = self.quote_cache.lookup(text, color_name)
+            if cached:
+                await self.quote_pipeline.wait_turn(chat_id, original_message.id)
+                if await self.send_cached_quote(client, cached, chat_id=chat_id):
+                    self.last_success["quote"] = time.time()
+                    return
+                self.quote_cache.forget(text, color_name)
             
-            # Wait briefly for color confirmation (longer sleep for reliability)
-            await asyncio.sleep(1) # Increased from 0.5s for reliability
+            # Drawn locally when the renderer can: no round trip to QuotLyBot
+            sticker = await self.render_local_quote(client, original_message.from_user, text, color_name)
+            if sticker:
+                await self.quote_pipeline.wait_turn(chat_id, original_message.id)
+                await client.send_sticker(chat_id, sticker)
+                self.last_success["quote"] = time.time()
+                return
             
-            # Send the text to be quoted
-            quote_request = await client.send_message("@QuotLyBot", text)
+            async def send_color():
+                # Switch QuotLyBot's color only if it isn't already set to it
+                color_msgs.extend(await self.ensure_quotly_color(client, color_name))
             
-            # Wait for QuotLyBot response
-            # Pass the ID of the last message sent to QuotLyBot to ensure we get a new response
-            response = await self.wait_for_quotly_response(client, quote_request.id)
+            # Send the text to be quoted right after the color change and wait for QuotLyBot's response
+            quote_request, response = await self.quote_pipeline.request(client, text, prepare=send_color)
             
             if response:
+                self.quote_cache.remember(text, color_name, response, quote_request)
+                
+                # Keep quotes in the same order as the messages that requested them
+                await self.quote_pipeline.wait_turn(chat_id, original_message.id)
+                
                 # Send the QuotLyBot response content as your own message
                 if response.photo:
                     # If it's a photo (quote image)
@@ -176,18 +421,19 @@ class TelegramUserbot:
                     # For any other media type, copy the message
                     await client.copy_message(original_message.chat.id, "@QuotLyBot", response.id)
                 
-                # Clean up QuotLyBot chat
-                await color_msg.delete()
-                await quote_request.delete()
-                if response:
-                    await response.delete()
+                self.last_success["quote"] = time.time()
+                
+                # Clean up QuotLyBot chat (batched in the background)
+                self.quotly_cleanup.add(*color_msgs, quote_request, response)
             
             else:
+                self.quotly_cleanup.add(*color_msgs, quote_request)
                 raise Exception("No response received from QuotLyBot for the quote request.")
         
         except Exception as e:
             await self.log_error(f"Error in quote_with_color: {str(e)}", original_message)
             # Restore original message if possible
+            await self.quote_pipeline.wait_turn(chat_id, original_message.id)
             await client.send_message(original_message.chat.id, f"❌ Quote failed: {text}")
     
     async def auto_quote_message(self, client: Client, message: Message):
@@ -197,45 +443,67 @@ class TelegramUserbot:
            If the message is standalone, the quote is sent as a new, standalone message.
            Always quotes the user's own message text.
            If quoting fails, the original message is restored.
+           The handler has already checked is_auto_quotable() and entered the quote pipeline.
         """
         original_text = message.text # Always quote the user's own message text
-        
+        journal_key = None
         try:
-            # Skip if message is a command or from a bot
-            if message.text and message.text.startswith('.') or (message.from_user and message.from_user.is_bot):
-                return
-            
-            # Store original message for potential restoration
-            msg_id = f"{message.chat.id}_{message.id}"
-            self.original_messages[msg_id] = original_text
-            
-            # 1. Delete the original message (as requested, in all scenarios)
-            await message.delete()
-            
-            # 2. Determine target_reply_id based on whether the original message was a reply
+            # 1. Determine target_reply_id based on whether the original message was a reply
             target_reply_id = None
             if message.reply_to_message:
                 target_reply_id = message.reply_to_message.id
             
-            # 3. NO LONGER sending /qcolor repeatedly here.
-            #    We rely on QuotLyBot maintaining the last set color from the .q color command.
+            # 2. Journal the original (durably) for restoration, then delete it
+            journal_key = await asyncio.to_thread(
+                self.quote_journal.begin, message.chat.id, message.id, original_text, target_reply_id
+            )
+            await message.delete()
+            
+            # The quote is sent as a reply if target_reply_id is set, otherwise standalone.
+            send_params = {
+                "chat_id": message.chat.id,
+            }
+            if target_reply_id:
+                send_params["reply_to_message_id"] = target_reply_id
             
-            # 4. Send the original message's text to QuotLyBot for quote generation
-            quote_request = await client.send_message("@QuotLyBot", original_text)
+            # Quotes look the same wherever they are sent, so the cache key is text + color.
+            quote_color = self.quotly_color(self.current_color)
+            cached = self.quote_cache.lookup(original_text, quote_color)
+            if cached:
+                await self.quote_pipeline.wait_turn(message.chat.id, message.id)
+                if await self.send_cached_quote(client, cached, **send_params):
+                    self.last_success["quote"] = time.time()
+                    await asyncio.to_thread(self.quote_journal.finish, journal_key)
+                    return
+                self.quote_cache.forget(original_text, quote_color)
+            
+            # Drawn locally when the renderer can: no round trip to QuotLyBot
+            sticker = await self.render_local_quote(client, message.from_user, original_text, quote_color)
+            if sticker:
+                await self.quote_pipeline.wait_turn(message.chat.id, message.id)
+                await client.send_sticker(sticker=sticker, **send_params)
+                self.last_success["quote"] = time.time()
+                await asyncio.to_thread(self.quote_journal.finish, journal_key)
+                return
             
-            # 5. Wait for response from @QuotLyBot
-            # Pass the ID of the last message sent to QuotLyBot to ensure we get a new response
-            response = await self.wait_for_quotly_response(client, quote_request.id)
+            # 3. Make sure QuotLyBot still uses our default color (a `.q color text` quote may have
+            #    switched it; "default" means QuotLyBot's own). Free when the tracked color already matches.
+            color_msgs = []
+            
+            async def restore_color():
+                color_msgs.extend(await self.ensure_quotly_color(client, quote_color))
+            
+            # 4. Send the original message's text to QuotLyBot for quote generation
+            # 5. Wait for response from @QuotLyBot (matched to this request by the pipeline)
+            quote_request, response = await self.quote_pipeline.request(client, original_text, prepare=restore_color)
             
             if response:
+                self.quote_cache.remember(original_text, quote_color, response, quote_request)
+                
+                # Earlier messages of this chat must be delivered first
+                await self.quote_pipeline.wait_turn(message.chat.id, message.id)
+                
                 # 6. Send the QuotLyBot response content.
-                # It will reply if target_reply_id is set, otherwise send standalone.
-                send_params = {
-                    "chat_id": message.chat.id,
-                }
-                if target_reply_id:
-                    send_params["reply_to_message_id"] = target_reply_id
-
                 if response.photo:
                     await client.send_photo(
                         photo=response.photo.file_id,
@@ -259,66 +527,37 @@ class TelegramUserbot:
                         **send_params
                     )
                 
-                # 7. Clean up QuotLyBot chat messages
-                try:
-                    await quote_request.delete()
-                    if response:
-                        await response.delete()
-                except Exception as e:
-                    print(f"Warning: Could not clean up QuotLyBot chat messages: {e}")
-                    pass # Continue even if cleanup fails
+                # 7. Clean up QuotLyBot chat messages (batched in the background)
+                self.quotly_cleanup.add(*color_msgs, quote_request, response)
                 
-                # Remove from cache since processing is complete
-                if msg_id in self.original_messages:
-                    del self.original_messages[msg_id]
+                # Processing is complete: nothing to restore any more
+                await asyncio.to_thread(self.quote_journal.finish, journal_key)
+                self.last_success["quote"] = time.time()
             
             else:
                 # If QuotLyBot doesn't respond, raise an error
+                self.quotly_cleanup.add(*color_msgs, quote_request)
                 raise Exception("QuotLyBot didn't respond to the quote request. Make sure you've started @QuotLyBot first.")
         
         except Exception as e:
             # Handle error: restore original message and log
             try:
                 # Restore the original message by sending it back to the same chat
+                await self.quote_pipeline.wait_turn(message.chat.id, message.id)
                 await client.send_message(message.chat.id, original_text)
                     
                 await self.log_error(f"Auto-quote failed, original message restored: {str(e)}", message)
                 
-                # Remove from cache since we restored it
-                if msg_id in self.original_messages:
-                    del self.original_messages[msg_id]
+                # Restored: drop it from the journal (if it was journaled at all)
+                if journal_key:
+                    await asyncio.to_thread(self.quote_journal.finish, journal_key)
                     
             except Exception as restore_error:
                 # If restoration also fails, log both errors
                 await self.log_error(f"Auto-quote failed and couldn't restore message. Original error: {str(e)}, Restore error: {str(restore_error)}", message)
-    
-    async def wait_for_quotly_response(self, client: Client, last_sent_message_id: int, timeout: int = 15) -> Optional[Message]:
-        """
-        Wait for QuotLyBot to respond with an actual quote message (photo/text/sticker)
-        that is newer than `last_sent_message_id`.
-        """
-        start_time = asyncio.get_event_loop().time()
-        while asyncio.get_event_loop().time() - start_time < timeout:
-            await asyncio.sleep(1) # Check every second for a new message
-            
-            async for message in client.get_chat_history("@QuotLyBot", limit=5): # Check a few recent messages
-                # Ensure it's from QuotLyBot and is a new message (newer ID)
-                if (message.from_user and 
-                    hasattr(message.from_user, 'username') and
-                    message.from_user.username == "QuotLyBot" and
-                    message.id > last_sent_message_id): 
-                    
-                    # Heuristic to find an actual quote message, not a command confirmation
-                    if message.photo or message.sticker:
-                        return message # Photos and stickers are almost certainly quotes
-                    
-                    if message.text:
-                        # QuotLyBot's color confirmation starts with "Color set to"
-                        # Return text if it's not a color confirmation
-                        if not message.text.lower().startswith("color set to"):
-                            return message 
-            
-        return None # No suitable response found within timeout
+        
+        finally:
+            self.quote_pipeline.leave(message.chat.id, message.id)
     
     async def police_command(self, client: Client, message: Message):
         """
@@ -344,79 +583,194 @@ class TelegramUserbot:
             "**Police Service Here**",
         ]
 
-        await message.edit_text("Police") # Initial message to show immediately
+        # "Police" shows immediately; the scheduler drops frames the chat can't keep up with,
+        # waits out FLOOD_WAIT and always lands the final frame
+        await self.edit_scheduler.play(message, ["Police"] + animation_chars, animation_interval)
 
-        for i in range(len(animation_chars)):
-            await asyncio.sleep(animation_interval)
-            await message.edit_text(animation_chars[i])
 
+    def build_handlers(self) -> list:
+        """The bot's (handler, group) pairs, built once and re-added to the client on every (re)connect."""
+        # Handlers only start the work and return: a command can wait seconds (QuotLyBot,
+        # Gemini, animations), and while it holds a dispatcher worker the replies it waits for
+        # can't be dispatched. The work itself runs as a task, timed by the metrics wrappers.
+        quote_work = metrics.instrument("quote")(self.handle_quote_command)
+        police_work = metrics.instrument("police")(self.police_command)
+        ask_work = metrics.instrument("ask")(ask_ai_command)
+        analyse_work = metrics.instrument("analyse")(analyse_word_command)
 
-    async def start(self):
-        """Start the userbot."""
-        if not await self.setup_client():
-            print("Failed to setup client")
-            return
+        # Quotes reserve their place in the chat's delivery order right here, before anything
+        # is awaited, so they are delivered in the order the messages arrived.
+        async def quote_command_handler(client, message):
+            if self.is_color_quote(message.text):
+                self.quote_pipeline.enter(message.chat.id, message.id)
+            self.spawn(quote_work(client, message))
         
-        try:
-            # Register handlers
-            @self.client.on_message(filters.me & filters.regex(r'^\.q\s'))
-            async def quote_command_handler(client, message):
-                await self.handle_quote_command(client, message)
-            
-            @self.client.on_message(filters.me & filters.text & ~filters.regex(r'^\.'))
-            async def auto_quote_handler(client, message):
-                if self.auto_quote_enabled:
-                    await self.auto_quote_message(client, message)
+        async def auto_quote(client, message):
+            async with metrics.track("auto_quote"):  # Only time messages that are actually quoted
+                await self.auto_quote_message(client, message)
+        
+        async def auto_quote_handler(client, message):
+            if self.auto_quote_enabled and self.is_auto_quotable(message):
+                self.quote_pipeline.enter(message.chat.id, message.id)
+                self.spawn(auto_quote(client, message))
 
-            # Register the police command
-            @self.client.on_message(filters.me & filters.command("police", prefixes="."))
-            async def police_cmd_handler(client, message):
-                await self.police_command(client, message)
+        # The police command
+        async def police_cmd_handler(client, message):
+            self.spawn(police_work(client, message))
 
-            # Register the new AI command (MODIFIED)
-            @self.client.on_message(filters.me & filters.command("ask", prefixes="."))
-            async def ask_ai_cmd_handler(client, message):
-                # Pass 'self' (the TelegramUserbot instance) to the external function
-                await ask_ai_command(self, client, message)
-            @self.client.on_message(filters.me & filters.regex(r"^\.analyse")) # NEW: Handler for .analyse command
-            async def analyse_command_handler(_, message: Message):
-                await analyse_word_command(self, self.client, message)
+        # The AI command
+        async def ask_ai_cmd_handler(client, message):
+            # Pass 'self' (the TelegramUserbot instance) to the external function
+            self.spawn(ask_work(self, client, message))
 
-            # Start client
-            await self.client.start()
-            print("✅ Userbot started successfully!")
-            
-            # Send startup message to Saved Messages
+        async def analyse_command_handler(_, message: Message):
+            self.spawn(analyse_work(self, self.client, message))
+
+        return [
+            self.quotly_router.handler(),
+            (MessageHandler(quote_command_handler,
+                            filters.me & filters.regex(r'^\.q\s')), 0),
+            (MessageHandler(auto_quote_handler,
+                            filters.me & filters.text & ~filters.regex(r'^\.')), 0),
+            (MessageHandler(police_cmd_handler,
+                            filters.me & filters.command("police", prefixes=".")), 0),
+            (MessageHandler(ask_ai_cmd_handler,
+                            filters.me & filters.command("ask", prefixes=".")), 0),
+            (MessageHandler(analyse_command_handler,
+                            filters.me & filters.regex(r"^\.analyse")), 0),
+        ]
+    
+    def spawn(self, coro) -> asyncio.Task:
+        """Run a handler's work as its own task, keeping a reference until it finishes."""
+        task = asyncio.create_task(coro)
+        self.handler_tasks.add(task)
+        task.add_done_callback(self._handler_task_done)
+        return task
+    
+    def _handler_task_done(self, task: asyncio.Task):
+        self.handler_tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            print(f"⚠️ Unhandled error in {task.get_coro().__qualname__}: {task.exception()!r}")
+    
+    def register_handlers(self):
+        """(Re-)attach every handler exactly once; Pyrogram's dispatcher drops them when the client stops."""
+        for handler, group in self.handlers:
+            if handler not in self.client.dispatcher.groups.get(group, ()):
+                self.client.add_handler(handler, group)
+    
+    @staticmethod
+    def is_fatal_error(error: Exception) -> bool:
+        """Errors that reconnecting can't fix: the session is gone and needs a new SESSION_STRING."""
+        error_id = getattr(error, "ID", None) or str(error)
+        return isinstance(error, Unauthorized) or any(name in error_id for name in FATAL_ERRORS)
+    
+    def reconnect_delay(self, attempt: int, base: float) -> float:
+        """Exponential backoff with full jitter, capped at RECONNECT_MAX_DELAY."""
+        return random.uniform(0, min(self.config.RECONNECT_MAX_DELAY, base * 2 ** attempt))
+    
+    async def connect(self):
+        """Attach handlers, connect, and (on the first connection only) run the startup tasks."""
+        self.register_handlers()
+        await self.client.start()
+        self.quotly_cleanup.start(self.client)
+        self.error_reporter.start(self.client)
+        self.set_connection_state("connected")
+        if self.has_connected:
+            print("✅ Userbot reconnected successfully!")
+            return
+        
+        self.has_connected = True
+        self.startup.mark("connect")
+        print("✅ Userbot started successfully!")
+        await self.restore_pending_messages()
+        self.startup.mark("journal_replay")
+        self.startup.report()  # Handlers are live from here on
+        if self.config.WARMUP_ON_START:
+            asyncio.create_task(self.warm_up())
+        
+        # Send startup message to Saved Messages
+        try:
+            await self.client.send_message("me", "🤖 **Userbot Started**\n\nCommands:\n• `.q start` - Enable auto-quote\n• `.q stop` - Disable auto-quote\n• `.q color text` - Quote with color\n• `.q color` - Set default color\n• `.police` - Display police siren animation\n• `.ask <question>` - Ask Envo AI a general question\n• `.ask web <text/reply>` - Search the web with DuckDuckGo\n• `.ask g <text/reply>` - Fix grammar of text/replied message\n• `.ask t <lang> <text/reply>` - Translate text/replied message to a language")
+        except Exception as e:
+            # Log any errors during startup message sending
+            print(f"Error sending startup message: {e}")
+        
+        print("🤖 Userbot is now monitoring messages...")
+    
+    async def monitor(self):
+        """
+        Health-probe the connection every HEALTH_PROBE_INTERVAL seconds; returns (so the
+        supervisor reconnects) after HEALTH_PROBE_FAILURES probes in a row fail or time out.
+        """
+        failures = 0
+        while True:
+            await asyncio.sleep(self.config.HEALTH_PROBE_INTERVAL)
             try:
-                await self.client.send_message("me", "🤖 **Userbot Started**\n\nCommands:\n• `.q start` - Enable auto-quote\n• `.q stop` - Disable auto-quote\n• `.q color text` - Quote with color\n• `.q color` - Set default color\n• `.police` - Display police siren animation\n• `.ask <question>` - Ask Envo AI a general question\n• `.ask web <text/reply>` - Search the web with DuckDuckGo\n• `.ask g <text/reply>` - Fix grammar of text/replied message\n• `.ask t <lang> <text/reply>` - Translate text/replied message to a language")
+                await asyncio.wait_for(self.client.get_me(), self.config.HEALTH_PROBE_TIMEOUT)
+                failures = 0
+            except FloodWait as e:
+                metrics.flood_wait(e.value, "health_probe")
+                failures = 0  # Telegram answered: the connection itself is fine
             except Exception as e:
-                # Log any errors during startup message sending
-                print(f"Error sending startup message: {e}")
-            
-            # Keep running
-            self.is_connected = True
-            print("🤖 Userbot is now monitoring messages...")
-            
-            # Keep the client running
+                if self.is_fatal_error(e) or "AUTH_KEY_DUPLICATED" in str(e):
+                    raise
+                failures += 1
+                print(f"⚠️ Health probe failed ({failures}/{self.config.HEALTH_PROBE_FAILURES}): {e!r}")
+                if failures >= self.config.HEALTH_PROBE_FAILURES:
+                    return
+    
+    async def disconnect(self):
+        try:
+            if self.client.is_connected:
+                await self.client.stop()
+        except Exception as e:
+            print(f"Warning: Could not stop client cleanly: {e}")
+    
+    async def start(self):
+        """Start the userbot and keep it connected (supervisor with jittered backoff)."""
+        self.status_publisher.start(self.collect_status)
+        self.set_connection_state("connecting")
+        if not await self.setup_client():
+            print("Failed to setup client")
+            self.set_connection_state("failed")
+            return
+        self.startup.mark("setup_client")
+        self.handlers = self.build_handlers()
+        
+        attempt = 0
+        try:
             while True:
-                await asyncio.sleep(1)
+                try:
+                    await self.connect()
+                    attempt = 0
+                    await self.monitor()
+                    print("⚠️ Connection looks dead, reconnecting...")
+                    self.set_connection_state("reconnecting")
+                    base_delay = RECONNECT_BASE_DELAY
+                except Exception as e:
+                    error_msg = str(e)
+                    if self.is_fatal_error(e):
+                        print(f"❌ Userbot error: {error_msg}\nThe session is no longer valid; set a new SESSION_STRING.\n")
+                        self.set_connection_state("failed")
+                        await self.disconnect()
+                        # Keep the web server running even if userbot fails (no polling: nothing to retry)
+                        await asyncio.Event().wait()
+                    if "AUTH_KEY_DUPLICATED" in error_msg:
+                        print("⚠️ Session is being used elsewhere. Userbot will wait...")
+                        self.set_connection_state("session_in_use")
+                        base_delay = SESSION_IN_USE_BASE_DELAY
+                    else:
+                        print(f"⚠️ Userbot connection error: {error_msg!r}")
+                        self.set_connection_state("reconnecting")
+                        base_delay = RECONNECT_BASE_DELAY
                 
-        except Exception as e:
-            error_msg = str(e)
-            if "AUTH_KEY_DUPLICATED" in error_msg:
-                print("⚠️ Session is being used elsewhere. Userbot will wait...")
-                # Wait and retry periodically
-                while True:
-                    await asyncio.sleep(60)  # Wait 1 minute
-                    try:
-                        await self.client.start()
-                        print("✅ Userbot reconnected successfully!\n")
-                        self.is_connected = True
-                        break
-                    except:
-                        continue
-            else:
-                print(f"❌ Userbot error: {error_msg}\n")
-                # Keep the web server running even if userbot fails
-                while True:
-                    await asyncio.sleep(10)
+                await self.disconnect()
+                delay = self.reconnect_delay(attempt, base_delay)
+                attempt += 1
+                print(f"🔄 Reconnecting in {delay:.1f}s (attempt {attempt})")
+                await asyncio.sleep(delay)
+        finally:
+            await self.state_store.flush()  # Don't lose a debounced write on shutdown
+            await self.quote_cache.flush()
+            if ask_command.response_cache:
+                await ask_command.response_cache.flush()
@@ -1,4 +1,21 @@
+import hashlib
+import math
+import mmap
 import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from collections import Counter
+from operator import itemgetter
+from typing import Optional
+
+try:
+    import numpy
+except ImportError:  # Optional: builds the pattern matrix vectorized; without it large lists skip the matrix
+    numpy = None
 
 # --- EMBEDDED COMPREHENSIVE 5-LETTER WORD LIST ---
 # This list is based on common Wordle-compatible word lists.
@@ -41,7 +58,7 @@ EMBEDDED_FIVE_LETTER_WORDS = [
     "EXACT", "EXALT", "EXCEL", "EXERT", "EXILE", "EXIST", "EXPEL", "EXTOL", "FABER", "FABLE",
     "FACET", "FAINT", "FAIRY", "FAITH", "FALSE", "FANCY", "FARCE", "FATAL", "FATTY", "FAULT",
     "FAVOR", "FEAST", "FEIGN", "FETCH", "FIBER", "FIELD", "FIEND", "FIFTH", "FIFTY", "FIGHT",
-    "FINAL", "FINCH", "FINDS", "FINES", "FINGER", "FINISH", "FIRST", "FISHT", "FIXED", "FLAME",
+    "FINAL", "FINCH", "FINDS", "FINES", "FIRST", "FISHT", "FIXED", "FLAME",
     "FLANK", "FLASH", "FLASK", "FLATS", "FLAWS", "FLEAS", "FLECK", "FLEET", "FLESH", "FLICK",
     "FLIER", "FLING", "FLINT", "FLIRT", "FLOAT", "FLOCK", "FLOOD", "FLOOR", "FLORA", "FLOSS",
     "FLOUR", "FLOUT", "FLOWN", "FLUID", "FLUNG", "FLUSH", "FLYER", "FOCAL", "FOCUS", "FORAY",
@@ -62,29 +79,402 @@ EMBEDDED_FIVE_LETTER_WORDS = [
     "VERYP", "VESTS", "VIBES", "VICAR", "VIDEO", "VIGIL", "VILLA", "VINYL", "VIOLA", "VIRAL",
     "VIRTU", "VIRUS", "VISIT", "VITAL", "VIVID", "VOCAL", "VODKA", "VOGUE", "VOICE", "VOIDU",
     "VOLTS", "VOMIT", "VOWEL", "VROUM", "WACKY", "WAGON", "WAIST", "WAIVE", "WALTZ", "WANDY",
-    "WANTY", "WARBL", "WARLY", "WARMS", "WARN", "WASPS", "WASTE", "WATCH", "WATER", "WAVES",
-    "WEARY", "WEAVE", "WEEDY", "WEIGH", "WEIRD", "WEREW", "WESTERN", "WETLY", "WHALE", "WHARF",
+    "WANTY", "WARBL", "WARLY", "WARMS", "WASPS", "WASTE", "WATCH", "WATER", "WAVES",
+    "WEARY", "WEAVE", "WEEDY", "WEIGH", "WEIRD", "WEREW", "WETLY", "WHALE", "WHARF",
     "WHEEL", "WHELP", "WHIFF", "WHILE", "WHILE", "WHINE", "WHINY", "WHIRL", "WHOLE", "WHOOP",
     "WIDEN", "WIDER", "WIDOW", "WIDTH", "WIELD", "WIGHT", "WILDY", "WINCE", "WINDU", "WINGY",
-    "WINKY", "WINNY", "WINTER", "WIPES", "WIRES", "WISHY", "WITTY", "WIZZY", "WOMAN", "WOMBY",
+    "WINKY", "WINNY", "WIPES", "WIRES", "WISHY", "WITTY", "WIZZY", "WOMAN", "WOMBY",
     "WORLD", "WORMS", "WORRY", "WORSE", "WORST", "WORTH", "WOULD", "WOUND", "WOVEN", "WRACK",
     "WRAPS", "WRATH", "WRING", "WRIST", "WRITE", "WRONG", "WROTE", "WRUNG", "YACHT", "YELLO",
-    "YIELD", "YOUNG", "YOUTH", "ZAPES", "ZEAL", "ZEBRA", "ZEROES", "ZONAL", "ZONES", "ZONKS",
+    "YIELD", "YOUNG", "YOUTH", "ZAPES", "ZEBRA", "ZONAL", "ZONES", "ZONKS",
     "ZOOID", "ZOOMS", "ZEPHY"
 ]
 # --- END EMBEDDED WORD LIST ---
 
+# Optional packed word lists (fixed-size records, see pack_word_list) replacing the embedded list
+ANSWERS_FILE = os.getenv('WORDLE_ANSWERS_FILE', '')
+ALLOWED_FILE = os.getenv('WORDLE_ALLOWED_FILE', '')
+
+# Commonness table used to rank likely answers (see load_frequencies for the format)
+FREQUENCY_FILE = os.getenv(
+    'WORDLE_FREQUENCY_FILE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'word_frequency.txt')
+)
+# Relative prior weight of a word being the answer, by commonness score
+FREQUENCY_PRIORS = {3: 1.0, 2: 0.5, 1: 0.15, 0: 0.02}
+
+# Fixed game states solve() is checked against the reference scan (`python wordle_solver.py --check`)
+REGRESSION_CORPUS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'wordle_regression.txt')
+
+# Per-game solver sessions not used for this long are dropped (seconds)
+SESSION_IDLE_TIMEOUT = 30 * 60
+
+# Guess x answer feedback patterns are cached here and memory-mapped on later runs
+PATTERN_CACHE_FILE = os.getenv(
+    'WORDLE_PATTERN_CACHE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'wordle_patterns.bin')
+)
+PATTERN_CACHE_MAGIC = b'WPM1'
+# Packed word list header: magic + encoding name (NUL-padded to 12 bytes). Files without it
+# are the original headerless latin-1 format.
+PACKED_MAGIC = b'WPL1'
+PACKED_HEADER_SIZE = 16
+INDEX_MAGIC = b'WIX2'
+# Without NumPy the matrix is built one feedback_code call (~4 µs) per pair; larger lists are
+# ranked on the fly over a sample instead (see WordleSolver._rank_without_matrix)
+PATTERN_MATRIX_MAX_PURE_PYTHON = 2_000_000
+PATTERN_BUILD_CHUNK = 4_000_000  # Guess x answer pairs per NumPy chunk (bounds memory while building)
+FALLBACK_RANK_WORDS = 200
+
+
+def feedback_code(guess: str, answer: str) -> int:
+    """
+    Wordle feedback for `guess` against `answer` as a base-3 number (0..242, fits in a byte):
+    digit i is 2 for green, 1 for yellow and 0 for red at position i.
+    """
+    digits = [0] * 5
+    remaining = {}
+    for i in range(5):
+        if guess[i] == answer[i]:
+            digits[i] = 2
+        else:
+            remaining[answer[i]] = remaining.get(answer[i], 0) + 1
+    for i in range(5):
+        if digits[i] == 0 and remaining.get(guess[i], 0) > 0:
+            digits[i] = 1
+            remaining[guess[i]] -= 1
+    code = 0
+    for digit in digits:
+        code = code * 3 + digit
+    return code
+
+
+def entropy(buckets: Counter, total: int) -> float:
+    """Entropy (bits) of a feedback distribution given as code -> count."""
+    return -sum(count / total * math.log2(count / total) for count in buckets.values())
+
+
+def pack_word_list(words, path: str, encoding: Optional[str] = None) -> int:
+    """
+    Writes `words` as a packed word list: a header naming the encoding, then sorted, unique,
+    uppercase 5-letter words as fixed-size records with no separators. Without an explicit
+    `encoding`, latin-1 (5-byte records) is used when every word fits, otherwise UTF-32
+    (20-byte records), so any alphabet can be packed. Returns the number of records written.
+    """
+    packed = sorted({word.strip().upper() for word in words if len(word.strip()) == 5 and word.strip().isalpha()})
+    if encoding is None:
+        encoding = 'latin-1' if all(ord(char) < 256 for word in packed for char in word) else 'utf-32-le'
+    record_size = PackedWordList.record_size(encoding)
+    with open(path, 'wb') as f:
+        f.write(PACKED_MAGIC + encoding.encode('ascii').ljust(12, b'\0'))
+        for word in packed:
+            try:
+                record = word.encode(encoding)
+            except UnicodeEncodeError:
+                record = b''
+            if len(record) != record_size:
+                raise ValueError(f"{word!r} is not {record_size} bytes in {encoding}; pack with encoding='utf-32-le'")
+            f.write(record)
+    return len(packed)
+
+
+def load_frequencies(path: str = FREQUENCY_FILE) -> dict:
+    """
+    Reads a commonness table: lines of `<score> WORD WORD ...` (score 1-3, higher = more common).
+    Blank lines and `#` comments are ignored. Returns {} if the file is missing.
+    """
+    frequencies = {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                parts = line.split()
+                if not parts or parts[0].startswith('#'):
+                    continue
+                score = min(int(parts[0]), 3)
+                for word in parts[1:]:
+                    frequencies[word.upper()] = score
+    except FileNotFoundError:
+        print(f"⚠️ Word frequency table {path} not found, answers will be ranked by information only.")
+    return frequencies
+
+
+class PackedWordList:
+    """
+    Read-only word sequence backed by a memory-mapped file of fixed-size records.
+    The file is validated once (length, letters only, uppercase, duplicates dropped, sorted);
+    the resulting record order is cached in `<path>.idx` and reused while the file is unchanged,
+    so large dictionaries cost neither import time nor per-process copies of the word list.
+    """
+
+    def __init__(self, path: str, encoding: str = 'latin-1'):
+        self.path = path
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self.offset = 0
+        self.encoding = encoding  # Only used for headerless files
+        if self.data[:len(PACKED_MAGIC)] == PACKED_MAGIC:
+            self.offset = PACKED_HEADER_SIZE
+            self.encoding = bytes(self.data[len(PACKED_MAGIC):PACKED_HEADER_SIZE]).rstrip(b'\0').decode('ascii')
+        self.record_size_bytes = self.record_size(self.encoding)
+        self.count = (len(self.data) - self.offset) // self.record_size_bytes
+        self.records = self._load_index()
+
+    @staticmethod
+    def record_size(encoding: str) -> int:
+        """Bytes per 5-letter record: 20 for UTF-32, 5 for single-byte codepages."""
+        if encoding.replace('_', '-').lower().startswith(('utf-32', 'utf32')):
+            return 20
+        if len('A'.encode(encoding)) != 1:
+            raise ValueError(f"Packed word lists need a fixed-width encoding, not {encoding}")
+        return 5
+
+    def _load_index(self) -> array:
+        stat = os.stat(self.path)
+        stamp = INDEX_MAGIC + struct.pack('<QQ', stat.st_size, stat.st_mtime_ns)
+        index_file = f"{self.path}.idx"
+        try:
+            with open(index_file, 'rb') as f:
+                if f.read(len(stamp)) == stamp:
+                    (count,) = struct.unpack('<I', f.read(4))
+                    records = array('I')
+                    records.frombytes(f.read())
+                    if len(records) == count and (not records or max(records) < self.count):
+                        return records
+        except (OSError, ValueError, struct.error):
+            pass  # Missing, truncated or corrupt: rebuild it below
+
+        records = self._validate()
+        try:
+            tmp_file = f"{index_file}.tmp"
+            with open(tmp_file, 'wb') as f:
+                f.write(stamp)
+                f.write(struct.pack('<I', len(records)))
+                f.write(records.tobytes())
+            os.replace(tmp_file, index_file)
+        except OSError as e:
+            print(f"⚠️ Could not write word list index {index_file}: {e}")
+        return records
+
+    def _validate(self) -> array:
+        if (len(self.data) - self.offset) % self.record_size_bytes:
+            raise ValueError(f"{self.path} is not a packed word list (size is not a multiple of {self.record_size_bytes})")
+        first_record = {}
+        skipped = 0
+        for record in range(self.count):
+            word = self._decode(record)
+            if len(word) == 5 and word.isalpha() and word == word.upper() and word not in first_record:
+                first_record[word] = record
+            else:
+                skipped += 1
+        if skipped:
+            print(f"⚠️ {self.path}: skipped {skipped} invalid or duplicate records")
+        return array('I', (first_record[word] for word in sorted(first_record)))
+
+    def _decode(self, record: int) -> str:
+        start = self.offset + record * self.record_size_bytes
+        return self.data[start:start + self.record_size_bytes].decode(self.encoding, errors='replace')
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __getitem__(self, i: int) -> str:
+        return self._decode(self.records[i])
+
+    def __iter__(self):
+        for record in self.records:
+            yield self._decode(record)
+
+
+class PatternMatrix:
+    """
+    Compact uint8 matrix of feedback codes, one row per guess and one column per answer.
+    Stored in a cache file (header + row-major bytes) and memory-mapped, so only the first
+    run pays for building it. The build streams rows straight into the file (vectorized with
+    NumPy when it's installed), so it never holds the whole matrix in memory.
+    """
+
+    def __init__(self, guesses: list[str], answers: list[str], cache_file: str = PATTERN_CACHE_FILE):
+        self.guesses = guesses
+        self.answers = answers
+        self.guess_index = {word: i for i, word in enumerate(guesses)}
+        self.answer_index = {word: i for i, word in enumerate(answers)}
+        self.width = len(answers)
+        self.header = self._header()
+        self.data = self._load(cache_file)
+
+    @staticmethod
+    def can_build(guesses: list[str], answers: list[str]) -> bool:
+        """Whether building the matrix for these lists takes seconds rather than minutes."""
+        return numpy is not None or len(guesses) * len(answers) <= PATTERN_MATRIX_MAX_PURE_PYTHON
+
+    def _header(self) -> bytes:
+        digest = hashlib.sha256(('\n'.join(self.guesses) + '\0' + '\n'.join(self.answers)).encode()).digest()
+        return PATTERN_CACHE_MAGIC + struct.pack('<II', len(self.guesses), len(self.answers)) + digest
+
+    def _load(self, cache_file: str):
+        header = self.header
+        size = len(header) + len(self.guesses) * self.width
+        try:
+            with open(cache_file, 'rb') as f:
+                if f.read(len(header)) == header and os.fstat(f.fileno()).st_size == size:
+                    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            pass
+
+        # Missing or built for another word list: rebuild it once. The temp file is unique, so
+        # a concurrent build (another process) never writes into the file being mapped here.
+        tmp_file = None
+        try:
+            fd, tmp_file = tempfile.mkstemp(prefix=os.path.basename(cache_file) + '.', suffix='.tmp',
+                                            dir=os.path.dirname(os.path.abspath(cache_file)))
+            with os.fdopen(fd, 'w+b') as f:
+                f.write(header)
+                for rows in self._build_rows():
+                    f.write(rows)
+                f.flush()
+                # Map our own file before publishing it: the name may be replaced again by another build
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            os.replace(tmp_file, cache_file)
+            return data
+        except OSError as e:
+            if tmp_file and os.path.exists(tmp_file):
+                os.unlink(tmp_file)
+            print(f"⚠️ Could not write Wordle pattern cache {cache_file}, keeping it in memory: {e}")
+        data = bytearray(header)
+        for rows in self._build_rows():
+            data += rows
+        return data
+
+    def _build_rows(self):
+        """Yields the matrix body in chunks of whole rows."""
+        if numpy is None:
+            for guess in self.guesses:
+                yield bytes(feedback_code(guess, answer) for answer in self.answers)
+            return
+
+        answers = numpy.array([[ord(char) for char in word] for word in self.answers], dtype=numpy.uint32)[None]
+        guesses = numpy.array([[ord(char) for char in word] for word in self.guesses], dtype=numpy.uint32)
+        chunk = max(1, PATTERN_BUILD_CHUNK // max(1, self.width))
+        for start in range(0, len(guesses), chunk):
+            guess = guesses[start:start + chunk, None, :]  # (chunk, 1, 5) against answers (1, n, 5)
+            green = guess == answers
+            unmatched = ~green
+            codes = numpy.zeros(green.shape[:2], dtype=numpy.uint8)
+            for i in range(5):
+                letter = guess[:, :, i]
+                # Same rule as feedback_code: yellow while the answer still has unmatched copies
+                # of the letter that earlier non-green copies in the guess haven't used up
+                available = sum((answers[:, :, j] == letter) & unmatched[:, :, j] for j in range(5))
+                used = sum((guess[:, :, k] == letter) & unmatched[:, :, k] for k in range(i))
+                yellow = unmatched[:, :, i] & (available > used)
+                codes = codes * 3 + green[:, :, i] * numpy.uint8(2) + yellow
+            yield codes.tobytes()
+
+    def row(self, guess_index: int) -> bytes:
+        start = len(self.header) + guess_index * self.width
+        return self.data[start:start + self.width]
+
+    def expected_information(self, guess_index: int, answer_indices: list[int]) -> float:
+        """Entropy (bits) of the feedback distribution `guess` produces over the given answers."""
+        if len(answer_indices) < 2:
+            return 0.0
+        # itemgetter + Counter run in C, so this is vectorized over the candidate set
+        return entropy(Counter(itemgetter(*answer_indices)(self.row(guess_index))), len(answer_indices))
+
+
 class WordleSolver:
-    def __init__(self):
-        # Use the embedded list directly
-        self.all_words = list(set(EMBEDDED_FIVE_LETTER_WORDS))
+    def __init__(self, answers_file: str = ANSWERS_FILE, allowed_file: str = ALLOWED_FILE):
+        # Possible answers, sorted so the pattern cache file has a stable layout
+        if answers_file:
+            self.all_words = PackedWordList(answers_file)
+        else:
+            # Fall back to the embedded list, dropping anything that isn't a 5-letter word
+            self.all_words = sorted({word for word in EMBEDDED_FIVE_LETTER_WORDS if len(word) == 5 and word.isalpha()})
+        # Words accepted as guesses (a superset of the answers when a separate list is given)
+        self.allowed_words = PackedWordList(allowed_file) if allowed_file else self.all_words
+        self.pattern_matrix = None  # Built on first ranking request (False: too big to build here)
+        self.pattern_matrix_lock = threading.Lock()  # The warm-up and .analyse threads may both ask for it
+        self.frequencies = load_frequencies()  # word -> commonness score (missing = 0)
+        self.sessions = {}  # session key -> {'guesses', 'mask', 'last_used'} for solve_session
+        self._build_index()
 
-    def solve(self, game_state_lines: str) -> list[str]:
+    def _build_index(self):
         """
-        Solves the Wordle-like game based on the provided game state.
-        Returns a list of possible words.
+        Precomputes integer bitsets over self.all_words (bit i set = word i matches):
+        - position_bits[p][letter]: words with `letter` at position p
+        - count_bits[letter][n]: words containing `letter` exactly n times (n >= 1)
+        A feedback line then becomes a handful of ANDs instead of a loop over every word.
+        """
+        self.valid_mask = 0  # Only 5-letter entries can ever match feedback
+        self.position_bits = [{} for _ in range(5)]
+        self.count_bits = {}
+        for i, word in enumerate(self.all_words):
+            if len(word) != 5:
+                continue
+            bit = 1 << i
+            self.valid_mask |= bit
+            for pos, char in enumerate(word):
+                self.position_bits[pos][char] = self.position_bits[pos].get(char, 0) | bit
+            for char in set(word):
+                counts = self.count_bits.setdefault(char, {})
+                n = word.count(char)
+                counts[n] = counts.get(n, 0) | bit
+
+    def _count_mask(self, char: str, n: int, exact: bool) -> int:
+        """Words containing `char` exactly n times (exact) or at least n times."""
+        counts = self.count_bits.get(char, {})
+        if exact and n == 0:
+            containing = 0
+            for bits in counts.values():
+                containing |= bits
+            return self.valid_mask & ~containing
+        if exact:
+            return counts.get(n, 0)
+        if n == 0:
+            return self.valid_mask
+        mask = 0
+        for count, bits in counts.items():
+            if count >= n:
+                mask |= bits
+        return mask
+
+    def _feedback_mask(self, guessed_word: str, emojis: str) -> int:
         """
-        possible_words = list(self.all_words) # Start with all words
+        Bitset of words consistent with one feedback line. Mirrors _matches_feedback exactly:
+        green pins the letter, yellow excludes the position, and a letter with n green/yellow
+        marks must appear at least n times, or exactly n times if it is also marked red.
+        """
+        mask = self.valid_mask
+        marked = {}  # letter -> number of green/yellow marks
+        red_letters = set()
+        for i in range(5):
+            char = guessed_word[i]
+            if emojis[i] == '🟩':
+                mask &= self.position_bits[i].get(char, 0)
+                marked[char] = marked.get(char, 0) + 1
+            elif emojis[i] == '🟨':
+                mask &= ~self.position_bits[i].get(char, 0)
+                marked[char] = marked.get(char, 0) + 1
+            elif emojis[i] == '🟥':
+                red_letters.add(char)
+
+        for char in set(marked) | red_letters:
+            mask &= self._count_mask(char, marked.get(char, 0), char in red_letters)
+        return mask
+
+    def _words_from_mask(self, mask: int) -> list[str]:
+        words = []
+        while mask:
+            low_bit = mask & -mask
+            words.append(self.all_words[low_bit.bit_length() - 1])
+            mask ^= low_bit
+        return words
+
+    @staticmethod
+    def _parse_guesses(game_state_lines: str) -> list[tuple[str, str]]:
+        """Valid (guessed_word, emojis) pairs from the game state text, in order."""
+        guesses = []
         
         # Parse game state lines
         lines = game_state_lines.strip().split('\n')
@@ -99,24 +489,138 @@ class WordleSolver:
 
             if len(emojis) != 5 or len(guessed_word) != 5:
                 continue # Skip invalid length guesses
-
-            # Filter words based on feedback
-            new_possible_words = []
-            for word in possible_words:
-                if self._matches_feedback(word, guessed_word, emojis):
-                    new_possible_words.append(word)
-            possible_words = new_possible_words
             
+            guesses.append((guessed_word, emojis))
+        return guesses
+
+    def _apply_guesses(self, possible_mask: Optional[int], guesses: list[tuple[str, str]]) -> Optional[int]:
+        """Narrows `possible_mask` (None = all words) by each guess's feedback."""
+        for guessed_word, emojis in guesses:
             # If no words remain, stop early
-            if not possible_words:
+            if possible_mask == 0:
                 break
-        
-        return possible_words
+            
+            # Filter words based on feedback
+            line_mask = self._feedback_mask(guessed_word, emojis)
+            possible_mask = line_mask if possible_mask is None else possible_mask & line_mask
+        return possible_mask
+
+    def _mask_to_list(self, possible_mask: Optional[int]) -> list[str]:
+        if possible_mask is None:
+            return list(self.all_words) # Start with all words
+        return self._words_from_mask(possible_mask)
+
+    def solve(self, game_state_lines: str) -> list[str]:
+        """
+        Solves the Wordle-like game based on the provided game state.
+        Returns a list of possible words.
+        """
+        return self._mask_to_list(self._apply_guesses(None, self._parse_guesses(game_state_lines)))
+
+    def solve_session(self, session_key, game_state_lines: str) -> list[str]:
+        """
+        Like solve(), but remembers the surviving candidates per game (e.g. per chat).
+        When the new state extends the previous one, only the new guess lines are applied;
+        any other state starts a fresh session. Sessions end when the word is found
+        (an all-green line) or after SESSION_IDLE_TIMEOUT seconds without use.
+        """
+        now = time.monotonic()
+        for key in [key for key, session in self.sessions.items()
+                    if now - session['last_used'] > SESSION_IDLE_TIMEOUT]:
+            del self.sessions[key]
+
+        guesses = self._parse_guesses(game_state_lines)
+        session = self.sessions.get(session_key)
+        if session is None or guesses[:len(session['guesses'])] != session['guesses']:
+            session = {'guesses': [], 'mask': None}
+
+        session['mask'] = self._apply_guesses(session['mask'], guesses[len(session['guesses']):])
+        session['guesses'] = guesses
+        session['last_used'] = now
+
+        if any(emojis == '🟩' * 5 for _, emojis in guesses):
+            self.sessions.pop(session_key, None)  # Game over, nothing left to remember
+        else:
+            self.sessions[session_key] = session
+        return self._mask_to_list(session['mask'])
+
+    def _get_pattern_matrix(self) -> Optional[PatternMatrix]:
+        with self.pattern_matrix_lock:
+            if self.pattern_matrix is None:
+                self._load_pattern_matrix()
+        return self.pattern_matrix or None
+
+    def _load_pattern_matrix(self):
+        answers = list(self.all_words)
+        guesses = answers if self.allowed_words is self.all_words else sorted(set(self.allowed_words) | set(answers))
+        if PatternMatrix.can_build(guesses, answers):
+            self.pattern_matrix = PatternMatrix(guesses, answers)
+        else:
+            print(f"⚠️ {len(guesses)}x{len(answers)} pattern matrix needs NumPy to build; ranking from samples instead.")
+            self.pattern_matrix = False
+
+    def warm_up(self):
+        """Load (or build) the pattern matrix ahead of the first ranking request (if it can be built here)."""
+        self._get_pattern_matrix()
+
+    def answer_probabilities(self, candidates: list[str]) -> dict:
+        """How likely each candidate is to be the secret word, from the local frequency table."""
+        weights = {word: FREQUENCY_PRIORS[self.frequencies.get(word, 0)] for word in candidates}
+        total = sum(weights.values())
+        return {word: weight / total for word, weight in weights.items()}
+
+    def rank_guesses(self, candidates: list[str], top: int = 5) -> list[tuple[str, float]]:
+        """
+        Ranks next guesses for the remaining candidates, best first.
+        With one or two candidates this is simply the most common word; otherwise every known
+        word is scored by expected information gain (bits), plus a bonus for likely answers since
+        guessing the secret word itself ends the game.
+        """
+        if not candidates:
+            return []
+        probabilities = self.answer_probabilities(candidates)
+        if len(candidates) <= 2:
+            ranked = sorted(candidates, key=lambda word: (-probabilities[word], word))
+            return [(word, probabilities[word]) for word in ranked[:top]]
+
+        matrix = self._get_pattern_matrix()
+        if matrix is None:
+            return self._rank_without_matrix(candidates, probabilities, top)
+        answer_indices = [matrix.answer_index[word] for word in candidates if word in matrix.answer_index]
+        remaining_bits = math.log2(len(answer_indices))
+        scored = []
+        for i, guess in enumerate(matrix.guesses):
+            score = matrix.expected_information(i, answer_indices) + probabilities.get(guess, 0.0) * remaining_bits
+            scored.append((score, guess in probabilities, guess))
+        # Ties go to words that could be the answer themselves
+        scored.sort(key=lambda item: (-item[0], not item[1], item[2]))
+        return [(guess, score) for score, _, guess in scored[:top]]
+
+    def _rank_without_matrix(self, candidates: list[str], probabilities: dict, top: int) -> list[tuple[str, float]]:
+        """
+        Fallback ranking with no pattern matrix: the likeliest candidates are scored as guesses
+        against an even sample of the candidates, computing feedback on the fly.
+        """
+        guesses = sorted(candidates, key=lambda word: (-probabilities[word], word))[:FALLBACK_RANK_WORDS]
+        sample = candidates[::max(1, len(candidates) // FALLBACK_RANK_WORDS)]
+        remaining_bits = math.log2(len(candidates))
+        scored = []
+        for guess in guesses:
+            buckets = Counter(feedback_code(guess, answer) for answer in sample)
+            scored.append((entropy(buckets, len(sample)) + probabilities[guess] * remaining_bits, guess))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [(guess, score) for score, guess in scored[:top]]
+
+    def best_guess(self, candidates: list[str]) -> Optional[str]:
+        """The best next guess for the given candidates (None if there are none)."""
+        ranked = self.rank_guesses(candidates, top=1)
+        return ranked[0][0] if ranked else None
 
     def _matches_feedback(self, candidate_word: str, guessed_word: str, emojis: str) -> bool:
         """
         Checks if a candidate word matches the given feedback for a guessed word.
         Optimized logic for Wordle rules, handling duplicates carefully.
+        Reference implementation for the bitset index used by solve().
         """
         if len(candidate_word) != 5 or len(guessed_word) != 5 or len(emojis) != 5:
             return False
@@ -166,3 +670,41 @@ class WordleSolver:
                     return False
         
         return True # If all checks pass, the word is a possible match
+
+    def check_regressions(self, corpus_file: str = REGRESSION_CORPUS_FILE) -> list[str]:
+        """
+        Runs every game state of the corpus (blank-line separated, `#` comments) through solve()
+        and through a plain scan with _matches_feedback. Returns the states where they differ.
+        """
+        with open(corpus_file, encoding='utf-8') as f:
+            lines = [line for line in f.read().split('\n') if not line.startswith('#')]
+        mismatches = []
+        for state in '\n'.join(lines).split('\n\n'):
+            if not state.strip():
+                continue
+            guesses = self._parse_guesses(state)
+            expected = [word for word in self.all_words
+                        if all(self._matches_feedback(word, guess, emojis) for guess, emojis in guesses)]
+            if self.solve(state) != expected:
+                mismatches.append(state)
+        return mismatches
+
+
+if __name__ == "__main__":
+    # Usage: python wordle_solver.py <words.txt> <output.bin>  (one word per line)
+    #        python wordle_solver.py --check [corpus.txt]
+    if len(sys.argv) in (2, 3) and sys.argv[1] == '--check':
+        solver = WordleSolver()
+        mismatches = solver.check_regressions(*sys.argv[2:])
+        for state in mismatches:
+            print(f"❌ solve() differs from _matches_feedback for:\n{state}\n")
+        if mismatches:
+            sys.exit(1)
+        print("✅ solve() matches _matches_feedback on the regression corpus")
+        sys.exit(0)
+    if len(sys.argv) != 3:
+        print("Usage: python wordle_solver.py <words.txt> <output.bin>\n       python wordle_solver.py --check [corpus.txt]")
+        sys.exit(1)
+    with open(sys.argv[1], encoding='utf-8') as f:
+        count = pack_word_list(f, sys.argv[2])
+    print(f"✅ Packed {count} words into {sys.argv[2]}")